@@ -0,0 +1,190 @@
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+import numpy as np
+import trytour
+from skyfieldshapes import At
+
+# ------------------------------------------------------------------------------
+# Offline benchmark for the trytour hot path
+#
+# The ephemeris is an analytic Keplerian stand-in: a planet on an elliptical
+# heliocentric orbit and up to nine moons on inclined elliptical orbits
+# around it. Each orbit answers .at(t) like a kernel segment (relative to
+# its center) and the bodies list their segments in vector_functions like
+# Skyfield's, so trytour chains them as it does the kernels' and no kernels
+# are needed.
+#
+#     python benchmark.py --output bench.json
+#     python benchmark.py --output new.json --baseline bench.json
+# ------------------------------------------------------------------------------
+
+class KeplerBody:
+    def __init__(self, target, a_km, e, inc, node, peri, m0, period_days, parent=None):
+        self.target = target
+        self.center = parent.target if parent is not None else 0
+        self.vector_functions = (parent.vector_functions if parent is not None else []) + [self]
+        self.a_km, self.e, self.m0 = a_km, e, m0
+        self.n = 2 * np.pi / period_days  # mean motion, rad/day
+        # Rotation from the orbital plane to the reference frame
+        cn, sn = np.cos(node), np.sin(node)
+        ci, si = np.cos(inc), np.sin(inc)
+        cp, sp = np.cos(peri), np.sin(peri)
+        self.p_hat = np.array([cn*cp - sn*sp*ci, sn*cp + cn*sp*ci, sp*si])
+        self.q_hat = np.array([-cn*sp - sn*cp*ci, -sn*sp + cn*cp*ci, cp*si])
+        self.calls = 0
+        self.epochs = 0
+
+    def state(self, jd):
+        """Position (km) and velocity (km/s) relative to the center, shape (3,) or (3, N)."""
+        m = self.m0 + self.n * (np.asarray(jd) - 2451545.0)
+        ecc = m.copy()
+        for _ in range(8):  # Newton on Kepler's equation
+            ecc -= (ecc - self.e*np.sin(ecc) - m) / (1 - self.e*np.cos(ecc))
+        x = self.a_km * (np.cos(ecc) - self.e)
+        y = self.a_km * np.sqrt(1 - self.e**2) * np.sin(ecc)
+        rate = self.n / (1 - self.e*np.cos(ecc)) / 86400.0  # dE/dt, rad/s
+        vx = -self.a_km * np.sin(ecc) * rate
+        vy = self.a_km * np.sqrt(1 - self.e**2) * np.cos(ecc) * rate
+        km = np.multiply.outer(self.p_hat, x) + np.multiply.outer(self.q_hat, y)
+        km_per_s = np.multiply.outer(self.p_hat, vx) + np.multiply.outer(self.q_hat, vy)
+        return km, km_per_s
+
+    def at(self, t):
+        self.calls += 1
+        self.epochs += np.size(t.tdb)
+        km, km_per_s = self.state(t.tdb)
+        return At(km, lambda: km_per_s)
+
+def synthetic_system(moons, seed=0):
+    """A planet at ~5 AU plus `moons` moons between 2e5 and 2e6 km."""
+    rng = np.random.default_rng(seed)
+    planet = KeplerBody(599, 7.785e8, 0.048, 0.023, 1.75, 4.78, 0.35, 4332.6)
+    system = {'Planet': planet}
+    radii = np.geomspace(2.0e5, 2.0e6, max(moons, 1))
+    for i in range(moons):
+        a_km = radii[i]
+        period = 1.77 * (a_km / 4.217e5) ** 1.5  # Kepler's third law, Io-scaled
+        system[f'Moon{i+1}'] = KeplerBody(
+            501 + i, a_km, rng.uniform(0, 0.05), rng.uniform(0, 0.05),
+            rng.uniform(0, 2*np.pi), rng.uniform(0, 2*np.pi), rng.uniform(0, 2*np.pi),
+            period, parent=planet)
+    return system
+
+def install(system, position_cache):
+    # Fresh caches and leg surfaces per measurement so counts do not depend on what ran before
+    trytour.POSITION_CACHE = position_cache
+    trytour.position_cache = trytour.PositionCache(tolerance_km=trytour.POSITION_TOLERANCE_KM)
+    trytour.chain_segments.clear()
+    trytour.bodies.clear()
+    for name, body in system.items():
+        trytour.bodies[name] = trytour.chain_body(name, body)
+        body.calls = body.epochs = 0
+    trytour.open_leg_surfaces()
+
+def measure(name, moons, system, position_cache, fn, repeat=1):
+    # Timed without tracemalloc, which slows allocation-heavy code several-fold;
+    # the peak comes from a second, traced call on fresh caches
+    install(system, position_cache)
+    distance_before = trytour.distance_evaluations
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    wall = time.perf_counter() - started
+    calls = sum(b.calls for b in system.values())
+    epochs = sum(b.epochs for b in system.values())
+    distance_evaluations = trytour.distance_evaluations - distance_before
+
+    install(system, position_cache)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {
+        'name': name,
+        'moons': moons,
+        'repeat': repeat,
+        'wall_s': wall,
+        'wall_per_call_s': wall / repeat,
+        'ephemeris_calls': calls,
+        'ephemeris_epochs': epochs,
+        'distance_evaluations': distance_evaluations,
+        'peak_kb': peak / 1024,
+    }
+    print(f"{name:24s} moons={moons}  {wall/repeat*1e3:10.3f} ms/call"
+          f"  at()={result['ephemeris_calls']:7d}  peak={result['peak_kb']:9.1f} kB")
+    return result
+
+def run(max_moons, repeat, position_cache):
+    trytour.leg_cache = None  # the benchmark measures computation, not the disk cache
+    t0 = trytour.tdb_seconds(trytour.ts.utc(2025, 1, 1))
+    results = []
+    for moons in range(1, max_moons + 1):
+        system = synthetic_system(moons)
+        names = list(system)
+        leg = lambda fn: lambda: fn(trytour.bodies['Planet'], trytour.bodies['Moon1'], t0)
+
+        results.append(measure('distance', moons, system, position_cache,
+                               leg(trytour.distance), repeat * 10))
+        results.append(measure('travel_time', moons, system, position_cache,
+                               leg(trytour.travel_time), repeat))
+        results.append(measure('optimal_departure', moons, system, position_cache,
+                               leg(trytour.optimal_departure), repeat))
+        results.append(measure('optimize_system_route', moons, system, position_cache,
+                               lambda: trytour.optimize_system_route(names, t0)))
+        trytour.reset_itinerary()
+    return results
+
+def compare(results, baseline):
+    base = {(r['name'], r['moons']): r for r in baseline['results']}
+    print("\n=== Compared with baseline (new / old) ===")
+    for r in results:
+        old = base.get((r['name'], r['moons']))
+        if old is None:
+            continue
+        wall = r['wall_per_call_s'] / old['wall_per_call_s'] if old['wall_per_call_s'] else float('nan')
+        calls = (r['ephemeris_calls'] / old['ephemeris_calls']
+                 if old['ephemeris_calls'] else float('nan'))
+        print(f"{r['name']:24s} moons={r['moons']}  wall x{wall:6.2f}  at() x{calls:6.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trytour hot path offline.")
+    parser.add_argument('--max-moons', type=int, default=9)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="calls per measurement for the per-leg functions")
+    parser.add_argument('--solver', choices=['held-karp', 'permutations', 'local-search'],
+                        default=trytour.ROUTE_SOLVER)
+    parser.add_argument('--no-position-cache', action='store_true')
+    parser.add_argument('--no-leg-surfaces', action='store_true',
+                        help="score system routes with optimal_departure instead of travel-time tables")
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--baseline', help="earlier --output file to compare against")
+    args = parser.parse_args()
+
+    trytour.ROUTE_SOLVER = args.solver
+    trytour.LEG_SURFACES = not args.no_leg_surfaces
+    results = run(args.max_moons, args.repeat, not args.no_position_cache)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'solver': args.solver,
+            'position_cache': not args.no_position_cache,
+            'leg_surfaces': trytour.LEG_SURFACES,
+            'departure_search': trytour.DEPARTURE_SEARCH,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+from skyfieldshapes import At
+
+# ------------------------------------------------------------------------------
+# Bodies as chains of ephemeris segments
+#
+# Skyfield answers kernel['Io'] with a VectorSum whose vector_functions are
+# the segments SSB -> Jupiter barycenter -> Io. A ChainBody keeps those links
+# (each one optionally wrapped, e.g. by the position cache) so that the
+# separation of two bodies can skip the links their chains share: Io-Europa
+# needs only the two planet-centric segments, never the SSB -> Jupiter one,
+# which saves work and avoids subtracting two ~8e8 km vectors to get a
+# ~3e5 km one. Bodies without vector_functions become a one-link chain.
+#
+# Two kernels can both provide a link (SSB -> Jupiter barycenter in de438
+# and in the satellite kernel). Such links are the same center and target
+# but not the same segment: the frame is still the planet's, and body2
+# carries the difference of the two versions so nothing is lost.
+# ------------------------------------------------------------------------------
+
+def chain_links(body):
+    """[(center, target, segment), ...] from the barycenter down to body."""
+    functions = getattr(body, 'vector_functions', None)
+    if functions is None:
+        return [(0, body.target, body)]
+    return [(vf.center, vf.target, vf) for vf in functions]
+
+class ChainBody:
+    def __init__(self, name, target, links):
+        self.name = name
+        self.target = target
+        self.links = links  # [(center, target, segment)], segment answers .at()
+
+    def at(self, time):
+        ats = [segment.at(time) for _, _, segment in self.links]
+        return At(sum(a.position.km for a in ats),
+                  lambda: sum(a.velocity.km_per_s for a in ats))
+
+    def __repr__(self):
+        return f"<ChainBody {self.name!r} {[(c, t) for c, t, _ in self.links]}>"
+
+class Negated:
+    """segment with the opposite sign: center relative to target."""
+    def __init__(self, segment):
+        self.segment = segment
+
+    def at(self, time):
+        a = self.segment.at(time)
+        return At(-a.position.km, lambda: -a.velocity.km_per_s)
+
+def shared_frame(body1, body2):
+    """
+    body1 and body2 relative to their shared center: the links their chains
+    share are left out (the whole bodies when they are not both chains).
+    A shared link from two different segments (two kernels) stays in body2
+    as its own version minus body1's.
+    """
+    if not (isinstance(body1, ChainBody) and isinstance(body2, ChainBody)):
+        return body1, body2
+    shared = 0
+    for (c1, t1, _), (c2, t2, _) in zip(body1.links, body2.links):
+        if (c1, t1) != (c2, t2):
+            break
+        shared += 1
+    if shared == len(body1.links) == len(body2.links):
+        shared -= 1  # the same body: keep one link so the zeros have the right shape
+    offset = []
+    for (c, t, s1), (_, _, s2) in zip(body1.links[:shared], body2.links[:shared]):
+        if s1 is not s2:
+            offset += [(c, t, s2), (t, c, Negated(s1))]
+    return (ChainBody(body1.name, body1.target, body1.links[shared:]),
+            ChainBody(body2.name, body2.target, body2.links[shared:] + offset))
+
+def relative_state(body1, body2, time, velocity=False):
+    """
+    Position (km) of body1 relative to body2, and the relative velocity
+    (km/s) if asked for; (3,) or (3, N) like Skyfield.
+    """
+    frame1, frame2 = shared_frame(body1, body2)
+    at1, at2 = frame1.at(time), frame2.at(time)
+    km = at1.position.km - at2.position.km
+    if not velocity:
+        return km, None
+    return km, at1.velocity.km_per_s - at2.velocity.km_per_s
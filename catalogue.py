@@ -0,0 +1,101 @@
+import argparse
+import os
+import pickle
+import time
+
+# ------------------------------------------------------------------------------
+# Body catalogue from the PlanetsAndMoons workbook
+#
+# The 'Objects' sheet lists every body with its system, NAIF code, sort key
+# ('Order', e.g. '07-503') and whether it is in the tour. load_catalogue
+# reads the columns trytour needs into a small DataFrame and pickles it
+# next to the kernels together with the workbook's size and mtime, so Excel
+# is only parsed again after the workbook changes. catalogue_systems turns
+# the table into a system_order list: systems in workbook order, each with
+# its planet first and the moons in NAIF order.
+#
+#     python catalogue.py --include all
+# ------------------------------------------------------------------------------
+
+CATALOGUE_PATH = 'PlanetsAndMoons 2.xlsx'
+SHEET = 'Objects'
+CACHE_PATH = os.path.join('ephemerides', '.catalogue.pkl')
+COLUMNS = {
+    'Name': 'name',
+    'Type': 'type',
+    'System': 'system',
+    'Code': 'code',
+    'Order': 'order',
+    'Include in Tour': 'include',
+    'Diameter (km)': 'diameter_km',
+    'Orbit Radius (km)': 'orbit_radius_km',
+}
+PLANET_TYPES = ('Planet', 'Dwarf Planet')
+
+def workbook_stamp(path, sheet):
+    st = os.stat(path)
+    return [os.path.abspath(path), sheet, st.st_size, st.st_mtime_ns]
+
+def read_workbook(path, sheet=SHEET):
+    import pandas as pd  # only when the workbook is parsed; the pickled table brings it along
+    table = pd.read_excel(path, sheet_name=sheet, usecols=list(COLUMNS))
+    table = table.rename(columns=COLUMNS).dropna(subset=['name', 'system'])
+    table['name'] = table['name'].astype(str).str.strip()
+    table['system'] = table['system'].astype(str).str.strip()
+    table['code'] = table['code'].astype('int64')
+    table['order'] = table['order'].astype(str)
+    table['include'] = table['include'].astype(str).str.strip().str.lower() == 'yes'
+    return table.sort_values('order', kind='stable').reset_index(drop=True)
+
+def load_catalogue(path=CATALOGUE_PATH, sheet=SHEET, cache_path=CACHE_PATH, verbose=True):
+    """The catalogue table, from the pickle when it was made from this very workbook."""
+    stamp = workbook_stamp(path, sheet)
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached['stamp'] == stamp:
+            return cached['table']
+    if verbose:
+        print(f"Reading catalogue: {path} [{sheet}]")
+    table = read_workbook(path, sheet)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            pickle.dump({'stamp': stamp, 'table': table}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return table
+
+def catalogue_systems(table, include='tour', min_diameter_km=0.0):
+    """
+    [(system name, [planet, moon, ...]), ...] like trytour.system_order.
+    - include='tour' keeps the bodies marked 'Include in Tour', 'all' every one
+    - moons smaller than min_diameter_km are left out; planets never are
+    - the Sun, and systems whose planet is not included, are skipped
+    """
+    systems = []
+    for system, rows in table.groupby('system', sort=False):
+        planets = rows[rows['type'].isin(PLANET_TYPES) & (rows['name'] == system)]
+        if planets.empty or (include == 'tour' and not planets['include'].iloc[0]):
+            continue
+        moons = rows[~rows.index.isin(planets.index)]
+        if include == 'tour':
+            moons = moons[moons['include']]
+        moons = moons[moons['diameter_km'] >= min_diameter_km].sort_values('code', kind='stable')
+        systems.append((f"{system} System", [system] + moons['name'].tolist()))
+    return systems
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the tour systems built from the body catalogue.")
+    parser.add_argument('--catalogue', default=CATALOGUE_PATH)
+    parser.add_argument('--sheet', default=SHEET)
+    parser.add_argument('--include', choices=['tour', 'all'], default='tour')
+    parser.add_argument('--min-diameter', type=float, default=0.0, help="km, for moons")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    table = load_catalogue(args.catalogue, args.sheet)
+    print(f"{len(table)} bodies in {time.perf_counter() - started:.3f} s")
+    for name, names in catalogue_systems(table, args.include, args.min_diameter):
+        print(f"{name}: {len(names) - 1} moons: {', '.join(names)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import time
+import numpy as np
+from skyfieldshapes import At, tdb_seconds
+
+spice = None  # spiceypy, imported by the first SpiceBackend
+
+# ------------------------------------------------------------------------------
+# Ephemeris backends behind trytour.load_body
+#
+# A backend turns a body name into an object with .target and
+# .at(t).position.km / .velocity.km_per_s (Skyfield's shapes: (3,) for a
+# scalar Time, (3, N) for an array) and, where it can, .vector_functions,
+# the segment chain from the Solar System Barycenter that bodychain uses.
+# Both backends resolve names and coverage through the KernelIndex.
+#     skyfield - kernel[code], as trytour always did
+#     spice    - spiceypy: each kernel is furnsh()ed once, positions come
+#                from spkpos/spkezr over the whole epoch array in J2000
+#                (the frame the kernels are written in, which Skyfield
+#                treats as ICRF), with ET taken from the TDB of the Time
+# SPICE picks the last loaded kernel when several cover a segment, while
+# Skyfield reads each body from the kernel it was resolved in, so a body
+# reached through a shared segment (e.g. SSB -> Jupiter barycenter in both
+# de438 and jup.bsp) can differ by the few km the kernels disagree on.
+#
+#     python ephemerisbackend.py --pairs Io:Europa,Earth:Moon --epochs 2000
+# ------------------------------------------------------------------------------
+
+BACKENDS = ('skyfield', 'spice')
+
+class SkyfieldBackend:
+    name = 'skyfield'
+
+    def __init__(self, kernel_index):
+        self.kernel_index = kernel_index
+
+    def body(self, name):
+        return self.kernel_index.body(name)
+
+    def paths_in_use(self):
+        return [k.path for k in self.kernel_index.kernels.values()]
+
+    def close(self):
+        pass
+
+class SpiceSegment:
+    """target relative to center, like one of Skyfield's vector_functions."""
+    def __init__(self, center, target, frame='J2000'):
+        self.center = center
+        self.target = target
+        self.frame = frame
+
+    def at(self, t):
+        et = tdb_seconds(t)  # SPICE ephemeris time
+        return At(self._positions(et), lambda: self._velocities(et))
+
+    def _positions(self, et):
+        km, _ = spice.spkpos(str(self.target), et, self.frame, 'NONE', str(self.center))
+        return np.asarray(km).T
+
+    def _velocities(self, et):
+        states, _ = spice.spkezr(str(self.target), et, self.frame, 'NONE', str(self.center))
+        return np.asarray(states)[..., 3:].T
+
+class SpiceBody(SpiceSegment):
+    """Barycentric, in one spkpos call per epoch array; the chain is kept for bodychain."""
+    def __init__(self, name, target, chain, frame='J2000'):
+        super().__init__(0, target, frame)
+        self.name = name
+        self.vector_functions = [SpiceSegment(c, t, frame) for c, t in chain]
+
+class SpiceBackend:
+    name = 'spice'
+
+    def __init__(self, kernel_index, frame='J2000'):
+        global spice
+        if spice is None:
+            try:
+                import spiceypy as spice
+            except ImportError:
+                raise ImportError("the 'spice' ephemeris backend needs spiceypy (pip install spiceypy)") from None
+        self.kernel_index = kernel_index
+        self.frame = frame
+        self.loaded = []  # furnsh()ed paths, in load order
+
+    def body(self, name):
+        found = self.kernel_index.resolve(name)
+        if found is None:
+            return None
+        path, code = found
+        if path not in self.loaded:
+            if self.kernel_index.verbose:
+                print(f"Loading kernel (SPICE): {path}")
+            spice.furnsh(path)
+            self.loaded.append(path)
+        return SpiceBody(name, code, self._chain(path, code), self.frame)
+
+    def _chain(self, path, code):
+        # [(center, target), ...] from the barycenter down to code, from the index
+        centers = {target: center for center, target, _, _ in self.kernel_index.files[path]['segments']}
+        chain = []
+        while code != 0:
+            chain.append((centers[code], code))
+            code = centers[code]
+        return chain[::-1]
+
+    def paths_in_use(self):
+        return list(self.loaded)
+
+    def close(self):
+        for path in self.loaded:
+            spice.unload(path)
+        self.loaded = []
+
+def make_backend(name, kernel_index):
+    if name == 'skyfield':
+        return SkyfieldBackend(kernel_index)
+    if name == 'spice':
+        return SpiceBackend(kernel_index)
+    raise ValueError(f"unknown ephemeris backend {name!r}, expected one of {BACKENDS}")
+
+# ------------------------------------------------------------------------------
+# Micro-benchmark: the same queries through every backend
+# ------------------------------------------------------------------------------
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+def compare_backends(pairs, epochs, repeat, start='2025-01-01', days=30.0):
+    import trytour
+    from bodychain import relative_state
+    kernel_index = trytour.index_kernels(verbose=False)
+    year, month, day = (int(x) for x in start.split('-'))
+    t = trytour.ts.utc(year, month, day) + np.linspace(0.0, days, epochs)
+    reference = {}
+    for backend_name in BACKENDS:
+        try:
+            backend = make_backend(backend_name, kernel_index)
+        except ImportError as e:
+            print(f"{backend_name}: skipped ({e})")
+            continue
+        for a, b in pairs:
+            body1, body2 = backend.body(a), backend.body(b)
+            scalar_s, _ = best_of(repeat, lambda: [body1.at(t[k]).position.km for k in range(20)])
+            array_s, (r, v) = best_of(repeat, lambda: relative_state(body1, body2, t, velocity=True))
+            line = (f"{backend_name:9s} {a}-{b}: {scalar_s / 20 * 1e6:8.1f} us per scalar .at(), "
+                    f"{array_s / epochs * 1e6:8.2f} us per epoch for position+velocity of the pair")
+            if (a, b) in reference:
+                line += f", max difference {np.max(np.abs(r - reference[a, b])):.3g} km"
+            else:
+                reference[a, b] = r
+            print(line)
+        backend.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the ephemeris backends on identical queries.")
+    parser.add_argument('--pairs', default='Io:Europa,Earth:Moon,Earth:Jupiter',
+                        help="comma-separated BODY:BODY pairs")
+    parser.add_argument('--epochs', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--start', default='2025-01-01')
+    args = parser.parse_args()
+    pairs = [tuple(p.split(':')) for p in args.pairs.split(',')]
+    compare_backends(pairs, args.epochs, args.repeat, args.start)
+
+if __name__ == '__main__':
+    main()
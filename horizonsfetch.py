@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# ------------------------------------------------------------------------------
+# Concurrent, cached JPL Horizons fetcher
+#
+# Queries go straight to the Horizons API (no astroquery needed) from a small
+# thread pool, with retry and exponential backoff on network errors, 429 and
+# 5xx. Every response is stored under CACHE_DIR by the SHA-256 of its query
+# (target, center, epochs, ephemeris type, ...), including "no such body"
+# answers, so a repeat run is answered from disk without touching the
+# network. Each entry carries the SHA-256 of its result text: an entry that
+# is unreadable or fails the check (a disk filled up mid-write, a file
+# edited by hand) is fetched again, so an interrupted or damaged run resumes
+# with the queries it is missing. Point base_url at a mirror or a local
+# stand-in server as needed (tests/test_horizonsfetch.py does).
+# ------------------------------------------------------------------------------
+
+HORIZONS_URL = 'https://ssd.jpl.nasa.gov/api/horizons.api'
+CACHE_DIR = 'horizonscache'
+MAX_WORKERS = 8  # JPL asks for modest concurrency
+RETRIES = 4
+BACKOFF_S = 1.0
+
+# Result text that means the target does not exist (cached like any answer)
+NOT_FOUND_MARKERS = (
+    'No ephemeris for target',
+    'No matches found',
+    'No such object',
+    'No such record',
+    'Cannot find',
+)
+
+def horizons_query(kind, target, location, epochs, **extra):
+    """
+    Horizons API parameters for one query.
+    - kind is 'ELEMENTS' or 'VECTORS'
+    - epochs is a Julian date, a list of them, or a dict with
+      'start', 'stop' (Julian dates) and 'step' (e.g. '1d'), as in astroquery
+    """
+    params = {
+        'format': 'json',
+        'COMMAND': target,
+        'OBJ_DATA': 'NO',
+        'MAKE_EPHEM': 'YES',
+        'EPHEM_TYPE': kind,
+        'CENTER': location,
+        'CSV_FORMAT': 'YES',
+    }
+    if isinstance(epochs, dict):
+        params['START_TIME'] = f"JD {epochs['start']}"
+        params['STOP_TIME'] = f"JD {epochs['stop']}"
+        params['STEP_SIZE'] = epochs['step']
+    else:
+        jds = epochs if isinstance(epochs, (list, tuple)) else [epochs]
+        params['TLIST'] = ' '.join(str(jd) for jd in jds)
+        params['TLIST_TYPE'] = 'JD'
+    params.update(extra)
+    return params
+
+def elements_query(target, location, epochs):
+    return horizons_query('ELEMENTS', target, location, epochs)
+
+def vectors_query(target, location, epochs, refplane='ECLIPTIC', units='AU-D', table='1'):
+    # table '1' is position only, '2' adds velocity
+    return horizons_query('VECTORS', target, location, epochs,
+                          VEC_TABLE=table, REF_PLANE=refplane, OUT_UNITS=units)
+
+def checksum(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def target_name(text):
+    """'Io (501)' from the 'Target body name:' line of a result."""
+    match = re.search(r'Target body name:\s*(.+?)\s*\{', text)
+    return match.group(1) if match else None
+
+def parse_vectors(text):
+    """Rows of (JDTDB, x, y, z[, vx, vy, vz]) from a CSV VECTORS result."""
+    rows = []
+    body = text.split('$$SOE', 1)[1].split('$$EOE', 1)[0]
+    for line in body.strip().splitlines():
+        fields = [f.strip() for f in line.split(',')]
+        rows.append([float(fields[0])] + [float(f) for f in fields[2:] if f])
+    return np.array(rows)
+
+class HorizonsFetcher:
+    def __init__(self, base_url=HORIZONS_URL, cache_dir=CACHE_DIR, max_workers=MAX_WORKERS,
+                 retries=RETRIES, backoff_s=BACKOFF_S, timeout_s=60):
+        self.base_url = base_url
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.hits = 0
+        self.requests = 0
+        self.retried = 0
+        self.damaged = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, params):
+        key = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def fetch(self, params):
+        """Result text of one query, or None if Horizons has no such body."""
+        path = self._path(params)
+        entry = self._cached(path)
+        if entry is not None:
+            self.hits += 1
+        else:
+            entry = self._request(params)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{id(entry)}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)  # atomic, so threads never see half a file
+        return entry['result'] if entry['found'] else None
+
+    def _cached(self, path):
+        # The entry at path, or None when it is missing or fails its checksum
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            self.damaged += 1
+            return None
+        if entry.get('sha256', checksum(entry['result'])) != checksum(entry['result']):
+            self.damaged += 1
+            return None
+        return entry
+
+    def fetch_many(self, queries):
+        """fetch() for every query on the thread pool; results in query order."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self.fetch, queries))
+
+    def _request(self, params):
+        url = self.base_url + '?' + urllib.parse.urlencode(params)
+        for attempt in range(self.retries + 1):
+            try:
+                self.requests += 1
+                with urllib.request.urlopen(url, timeout=self.timeout_s) as response:
+                    payload = json.loads(response.read().decode())
+                break
+            except urllib.error.HTTPError as e:
+                if e.code != 429 and e.code < 500 or attempt == self.retries:
+                    raise
+            except (urllib.error.URLError, TimeoutError, ConnectionError):
+                if attempt == self.retries:
+                    raise
+            self.retried += 1
+            time.sleep(self.backoff_s * 2 ** attempt * (0.5 + random.random()))
+        text = payload.get('result') or payload.get('error', '')
+        found = not any(marker in text for marker in NOT_FOUND_MARKERS)
+        if found and 'error' in payload:
+            raise ValueError(f"Horizons error: {payload['error']}")  # not cached
+        return {'found': found, 'result': text, 'sha256': checksum(text)}
+
+    def stats(self):
+        return {'cache_hits': self.hits, 'requests': self.requests, 'retries': self.retried,
+                'damaged': self.damaged}
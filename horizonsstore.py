@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+from datetime import datetime
+import numpy as np
+from skyfieldshapes import At
+
+# ------------------------------------------------------------------------------
+# Local ephemeris store built from Horizons vector tables
+#
+# For bodies no .bsp kernel covers. Each body is ingested once from Horizons
+# as barycentric ICRF states (km, km/day) on a uniform TDB grid and saved as
+# two .npy files: the raw states and per-interval cubic Hermite
+# coefficients. The files are memory-mapped on use and the epoch index is
+# implicit (start + i * step), so a lookup is constant time and a run needs
+# no network at all. Bodies answer .at(t).position.km like Skyfield's.
+#
+#     python horizonsstore.py Nereid 802 2025-01-01 2026-01-01 --step-minutes 60
+# ------------------------------------------------------------------------------
+
+STORE_DIR = os.path.join('ephemerides', 'horizons')
+STEP_MINUTES = 30  # Hermite error ~0.7 km for Phobos, far less for slower moons
+MAX_ROWS_PER_QUERY = 80000  # Horizons caps the output of a single query
+
+def julian_date(text):
+    """TDB Julian date of an ISO date (UTC; the ~1 min offset does not matter here)."""
+    delta = datetime.fromisoformat(text) - datetime(2000, 1, 1, 12)
+    return 2451545.0 + delta.total_seconds() / 86400.0
+
+def hermite_coefficients(states, step_days):
+    # Interval i: p(s) = c0 + c1 s + c2 s^2 + c3 s^3 for s in [0, 1]
+    p0, p1 = states[:-1, :3], states[1:, :3]
+    m0, m1 = states[:-1, 3:] * step_days, states[1:, 3:] * step_days
+    return np.stack([p0, m0, 3*(p1 - p0) - 2*m0 - m1, 2*(p0 - p1) + m0 + m1], axis=1)
+
+class StoreBody:
+    def __init__(self, name, target, coefficients, start_jd, step_days):
+        self.name = name
+        self.target = target
+        self.coefficients = coefficients  # memmap, (intervals, 4, 3)
+        self.start_jd = start_jd
+        self.step_days = step_days
+        self.end_jd = start_jd + step_days * len(coefficients)
+
+    def _interval(self, jd):
+        x = (np.asarray(jd, dtype=float) - self.start_jd) / self.step_days
+        if np.any(x < 0) or np.any(x > len(self.coefficients)):
+            raise ValueError(f"{self.name}: epoch outside the stored range "
+                             f"JD {self.start_jd} to {self.end_jd}")
+        i = np.minimum(np.floor(x).astype(int), len(self.coefficients) - 1)
+        return (x - i)[..., None], self.coefficients[i]
+
+    def positions_km(self, jd):
+        s, c = self._interval(jd)
+        km = c[..., 0, :] + s*(c[..., 1, :] + s*(c[..., 2, :] + s*c[..., 3, :]))
+        return km.T  # (3,) or (3, N), as Skyfield returns
+
+    def velocities_km_per_s(self, jd):
+        s, c = self._interval(jd)
+        per_step = c[..., 1, :] + s*(2*c[..., 2, :] + 3*s*c[..., 3, :])
+        return per_step.T / (self.step_days * 86400.0)
+
+    def at(self, t):
+        return At(self.positions_km(t.tdb), lambda: self.velocities_km_per_s(t.tdb))
+
+class HorizonsStore:
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.index = {}  # lower-case name -> {name, code, start_jd, step_days, intervals}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        self.opened = {}
+
+    def _file(self, code, kind):
+        return os.path.join(self.directory, f"{code}.{kind}.npy")
+
+    def resolve(self, name):
+        return self.index.get(name.lower())
+
+    def coverage(self, name):
+        entry = self.index[name.lower()]
+        return entry['start_jd'], entry['start_jd'] + entry['step_days'] * entry['intervals']
+
+    def body(self, name):
+        entry = self.resolve(name)
+        if entry is None:
+            return None
+        if name.lower() not in self.opened:
+            coefficients = np.load(self._file(entry['code'], 'hermite'), mmap_mode='r')
+            self.opened[name.lower()] = StoreBody(entry['name'], entry['code'], coefficients,
+                                                  entry['start_jd'], entry['step_days'])
+        return self.opened[name.lower()]
+
+    def paths_in_use(self):
+        """Files behind the opened bodies, for cache fingerprints."""
+        return [self._file(body.target, 'hermite') for body in self.opened.values()]
+
+    def ingest(self, name, code, start_jd, stop_jd, step_minutes=STEP_MINUTES, fetcher=None):
+        """Fetch barycentric states for code and add them to the store as name."""
+        from horizonsfetch import HorizonsFetcher, vectors_query, parse_vectors  # the network only here
+        fetcher = fetcher or HorizonsFetcher()
+        step_days = step_minutes / 1440.0
+        chunk_days = MAX_ROWS_PER_QUERY * step_days
+        bounds = list(np.arange(start_jd, stop_jd, chunk_days)) + [stop_jd]
+        queries = [vectors_query(str(code), '@0', {'start': a, 'stop': b, 'step': f"{step_minutes}m"},
+                                 refplane='FRAME', units='KM-S', table='2')
+                   for a, b in zip(bounds[:-1], bounds[1:])]
+        texts = fetcher.fetch_many(queries)
+        if any(text is None for text in texts):
+            raise ValueError(f"Horizons has no vectors for {name} ({code})")
+        # Consecutive chunks share their boundary epoch
+        rows = np.concatenate([parse_vectors(text)[(k > 0):] for k, text in enumerate(texts)])
+        if not np.allclose(np.diff(rows[:, 0]), step_days, atol=1e-6):
+            raise ValueError(f"{name}: Horizons epochs are not on a uniform {step_minutes} min grid")
+        states = rows[:, 1:7].copy()
+        states[:, 3:] *= 86400.0  # km/s -> km/day
+
+        os.makedirs(self.directory, exist_ok=True)
+        for kind, array in (('states', states), ('hermite', hermite_coefficients(states, step_days))):
+            tmp = self._file(code, kind) + '.tmp.npy'
+            np.save(tmp, array)
+            os.replace(tmp, self._file(code, kind))
+        self.index[name.lower()] = {'name': name, 'code': int(code), 'start_jd': float(rows[0, 0]),
+                                    'step_days': step_days, 'intervals': len(rows) - 1}
+        self.opened.pop(name.lower(), None)
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, self.index_path)
+        print(f"Stored {name} ({code}): {len(rows)} states from JD {rows[0, 0]} to {rows[-1, 0]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a body from Horizons into the local store.")
+    parser.add_argument('name', help="name trytour uses, e.g. Nereid")
+    parser.add_argument('code', type=int, help="NAIF ID, e.g. 802")
+    parser.add_argument('start', help="first date, YYYY-MM-DD")
+    parser.add_argument('stop', help="last date, YYYY-MM-DD")
+    parser.add_argument('--step-minutes', type=int, default=STEP_MINUTES)
+    parser.add_argument('--store', default=STORE_DIR)
+    args = parser.parse_args()
+    HorizonsStore(args.store).ingest(args.name, args.code, julian_date(args.start),
+                                     julian_date(args.stop), args.step_minutes)
+
+if __name__ == '__main__':
+    main()
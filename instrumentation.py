@@ -0,0 +1,136 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+from contextlib import contextmanager
+import numpy as np
+
+# ------------------------------------------------------------------------------
+# Hot-path instrumentation for tour runs
+#
+# trytour keeps a module-level `instrumentation` that is None unless a report
+# was asked for, so a normal run only pays for a few `is not None` checks.
+# When enabled it counts ephemeris .at() calls per body (below any position
+# cache, i.e. real Skyfield evaluations), fixed-point iterations and
+# non-convergence in travel_time, and wall time per system solve. The
+# report is a JSON document written next to the itinerary.
+# ------------------------------------------------------------------------------
+
+class CountingBody:
+    def __init__(self, counts, body):
+        self.counts = counts  # [calls, epochs], shared with the Instrumentation
+        self.body = body
+
+    def at(self, t):
+        self.counts[0] += 1
+        self.counts[1] += np.size(t.tt)
+        return self.body.at(t)
+
+    def __getattr__(self, name):
+        return getattr(self.body, name)
+
+class Instrumentation:
+    def __init__(self, profile_system=None, profiler='cprofile'):
+        self.started = time.perf_counter()
+        self.at_counts = {}  # body name -> [calls, epochs]
+        self.travel_calls = 0
+        self.travel_iterations = 0
+        self.not_converged = 0
+        self.iteration_histogram = {}  # iterations -> travel_time solves
+        self.systems = []
+        self.profile_system = profile_system
+        self.profiler = profiler
+        self.profile = None
+
+    def wrap(self, name, body):
+        return CountingBody(self.at_counts.setdefault(name, [0, 0]), body)
+
+    def travel_time(self, iterations, converged, count=1):
+        """Record `count` travel-time solves that took `iterations` rounds."""
+        self.travel_calls += count
+        self.travel_iterations += iterations * count
+        if not converged:
+            self.not_converged += count
+        self.iteration_histogram[iterations] = self.iteration_histogram.get(iterations, 0) + count
+
+    def at_totals(self):
+        return (sum(c[0] for c in self.at_counts.values()),
+                sum(c[1] for c in self.at_counts.values()))
+
+    @contextmanager
+    def system(self, name, **details):
+        """Time one system solve; profile it too if it is profile_system."""
+        calls_before, epochs_before = self.at_totals()
+        travel_before = self.travel_calls
+        profiler = None
+        if name == self.profile_system and self.profile is None:
+            profiler = self._start_profiler()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - started
+            if profiler is not None:
+                self.profile = self._stop_profiler(profiler)
+            calls, epochs = self.at_totals()
+            self.systems.append({
+                'system': name,
+                **details,
+                'wall_s': wall,
+                'ephemeris_calls': calls - calls_before,
+                'ephemeris_epochs': epochs - epochs_before,
+                'travel_time_solves': self.travel_calls - travel_before,
+            })
+
+    def _start_profiler(self):
+        if self.profiler == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("pyinstrument is not installed, profiling with cProfile instead")
+                self.profiler = 'cprofile'
+            else:
+                profiler = Profiler()
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler):
+        if self.profiler == 'pyinstrument':
+            profiler.stop()
+            return profiler.output_text()
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(30)
+        return out.getvalue().strip()
+
+    def report(self, **extra):
+        calls, epochs = self.at_totals()
+        return {
+            'wall_s': time.perf_counter() - self.started,
+            'ephemeris': {
+                'calls': calls,
+                'epochs': epochs,
+                'per_body': {name: {'calls': c, 'epochs': e}
+                             for name, (c, e) in sorted(self.at_counts.items())},
+            },
+            'travel_time': {
+                'solves': self.travel_calls,
+                'iterations': self.travel_iterations,
+                'mean_iterations': (self.travel_iterations / self.travel_calls
+                                    if self.travel_calls else 0.0),
+                'not_converged': self.not_converged,
+                'iteration_histogram': {str(k): v for k, v in sorted(self.iteration_histogram.items())},
+            },
+            'systems': self.systems,
+            'profile': {'system': self.profile_system, 'profiler': self.profiler,
+                        'output': self.profile} if self.profile_system else None,
+            **extra,
+        }
+
+    def write(self, path, **extra):
+        with open(path, 'w') as f:
+            json.dump(self.report(**extra), f, indent=2, default=str)
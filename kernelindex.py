@@ -0,0 +1,121 @@
+import json
+import os
+from jplephem.names import target_name_pairs
+from jplephem.spk import SPK
+
+# ------------------------------------------------------------------------------
+# Coverage index over the SPK kernels, so bodies resolve without opening them
+#
+# For every kernel the index records (center, target, start, end) of each
+# segment, read from the DAF summaries only. It is saved as JSON next to the
+# kernels and a file is re-read only when its size or mtime changes. A body
+# resolves to the first kernel (in the order given) whose segments connect
+# it to the Solar System Barycenter, which is what Skyfield's kernel[name]
+# needs; only those kernels are ever load()ed.
+# ------------------------------------------------------------------------------
+
+# Planets resolve to their barycenter first, as trytour.load_body always did
+BARYCENTER_NAMES = {
+    'mercury', 'venus', 'earth', 'mars', 'jupiter',
+    'saturn', 'uranus', 'neptune', 'pluto',
+}
+NAME_CODES = {name: code for code, name in target_name_pairs}
+
+class KernelIndex:
+    def __init__(self, paths, index_path, verbose=True):
+        self.paths = list(paths)
+        self.index_path = index_path
+        self.verbose = verbose
+        self.files = {}  # path -> {'mtime_ns', 'size', 'segments': [[center, target, start_jd, end_jd], ...]}
+        self.reachable = {}  # path -> {code: (start_jd, end_jd)} for codes that chain to 0
+        self.names = {}  # name -> (path, code), filled on first lookup
+        self.kernels = {}  # path -> opened SpiceKernel
+        self.rescanned = 0
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.files = json.load(f)
+        self._refresh()
+        for path in self.paths:
+            self.reachable[path] = self._chains(self.files[path]['segments'])
+
+    def _refresh(self):
+        changed = False
+        for path in self.paths:
+            st = os.stat(path)
+            entry = self.files.get(path)
+            if entry and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+                continue
+            if self.verbose:
+                print(f"Indexing kernel: {path}")
+            spk = SPK.open(path)
+            segments = [[s.center, s.target, s.start_jd, s.end_jd] for s in spk.segments]
+            spk.close()
+            self.files[path] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size,
+                                'segments': segments}
+            self.rescanned += 1
+            changed = True
+        for path in list(self.files):
+            if path not in self.paths:
+                del self.files[path]
+                changed = True
+        if changed:
+            with open(self.index_path, 'w') as f:
+                json.dump(self.files, f)
+
+    @staticmethod
+    def _chains(segments):
+        # Coverage of each target = union of its segments, intersected along
+        # the chain of centers down to the barycenter
+        links = {}
+        for center, target, start, end in segments:
+            c, s, e = links.get(target, (center, start, end))
+            links[target] = (c, min(s, start), max(e, end))
+        reachable = {}
+        for target in links:
+            code, start, end = target, -float('inf'), float('inf')
+            seen = set()
+            while code != 0 and code in links and code not in seen:
+                seen.add(code)
+                center, s, e = links[code]
+                start, end = max(start, s), min(end, e)
+                code = center
+            if code == 0:
+                reachable[target] = (start, end)
+        return reachable
+
+    def resolve(self, name):
+        """Return (path, code) for a body name, or None if no kernel has it."""
+        if name in self.names:
+            return self.names[name]
+        labels = []
+        if name.lower() in BARYCENTER_NAMES:
+            labels.append(name.upper() + ' BARYCENTER')
+        labels.append(name.upper())
+        codes = [NAME_CODES[label] for label in labels if label in NAME_CODES]
+        found = None
+        for path in self.paths:
+            for code in codes:
+                if code in self.reachable[path]:
+                    found = (path, code)
+                    break
+            if found:
+                break
+        self.names[name] = found
+        return found
+
+    def coverage(self, name):
+        """(start, end) TDB Julian dates over which the body can be evaluated."""
+        path, code = self.resolve(name)
+        return self.reachable[path][code]
+
+    def body(self, name):
+        found = self.resolve(name)
+        if found is None:
+            return None
+        path, code = found
+        if path not in self.kernels:
+            from skyfield.api import load  # Skyfield is only imported once a kernel is opened
+            if self.verbose:
+                print(f"Loading kernel: {path}")
+            self.kernels[path] = load(path)
+        return self.kernels[path][code]
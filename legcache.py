@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# ------------------------------------------------------------------------------
+# Persistent leg-cost cache for trytour.optimal_departure
+#
+# Rows are keyed by a configuration fingerprint (tour constants plus the name,
+# size and mtime of every loaded kernel), the NAIF IDs of the two bodies and
+# the departure epoch (TDB seconds past J2000) quantized to quantum_s
+# seconds. The stored departure is kept as a wait relative to the requested
+# epoch, so a hit is reused as-is by a query anywhere in the same quantum.
+# ------------------------------------------------------------------------------
+
+def kernel_fingerprint(paths):
+    h = hashlib.sha1()
+    for path in sorted(paths):
+        st = os.stat(path)
+        h.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+class LegCache:
+    def __init__(self, path, kernel_paths, settings, max_entries=500000,
+                 quantum_s=60):
+        self.path = path
+        self.max_entries = max_entries
+        self.quantum_s = quantum_s
+        blob = json.dumps({'kernels': kernel_fingerprint(kernel_paths),
+                           'quantum_s': quantum_s, **settings}, sort_keys=True)
+        self.config = hashlib.sha1(blob.encode()).hexdigest()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.touched = []  # last_used updates for hits, written with the next put
+        # shared by pool workers; tourservice uses it from its handler threads, one at a time
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS legs (
+                config TEXT NOT NULL,
+                body1 INTEGER NOT NULL,
+                body2 INTEGER NOT NULL,
+                epoch INTEGER NOT NULL,
+                wait_s REAL NOT NULL,
+                travel_s REAL NOT NULL,
+                total_s REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (config, body1, body2, epoch)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS legs_last_used ON legs (last_used)")
+        self.size = self.conn.execute("SELECT COUNT(*) FROM legs").fetchone()[0]
+
+    def _epoch(self, seconds):
+        return int(round(seconds / self.quantum_s))
+
+    def get(self, body1, body2, seconds):
+        key = (self.config, body1, body2, self._epoch(seconds))
+        row = self.conn.execute(
+            "SELECT wait_s, travel_s, total_s FROM legs"
+            " WHERE config=? AND body1=? AND body2=? AND epoch=?", key).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touched.append((time.time(),) + key)
+        return row
+
+    def _flush_touched(self):
+        if self.touched:
+            self.conn.executemany(
+                "UPDATE legs SET last_used=? WHERE config=? AND body1=? AND body2=? AND epoch=?",
+                self.touched)
+            self.touched = []
+
+    def put(self, body1, body2, seconds, wait_s, travel_s, total_s):
+        key = (self.config, body1, body2, self._epoch(seconds))
+        values = (float(wait_s), float(travel_s), float(total_s), time.time())
+        if self.conn.execute("INSERT OR IGNORE INTO legs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             key + values).rowcount:
+            self.size += 1
+        else:  # already there (another worker, or a query in the same quantum)
+            self.conn.execute(
+                "UPDATE legs SET wait_s=?, travel_s=?, total_s=?, last_used=?"
+                " WHERE config=? AND body1=? AND body2=? AND epoch=?", values + key)
+        self._flush_touched()
+        if self.size > self.max_entries:
+            self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        # Drop the least recently used tenth in one statement
+        count = max(1, self.max_entries // 10)
+        self.evictions += self.conn.execute(
+            "DELETE FROM legs WHERE rowid IN"
+            " (SELECT rowid FROM legs ORDER BY last_used LIMIT ?)", (count,)).rowcount
+        self.size = self.conn.execute("SELECT COUNT(*) FROM legs").fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+    def close(self):
+        self._flush_touched()
+        self.conn.commit()
+        self.conn.close()
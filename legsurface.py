@@ -0,0 +1,220 @@
+import itertools
+import numpy as np
+
+# ------------------------------------------------------------------------------
+# Precomputed travel-time surfaces for the legs inside one system
+#
+# Route scoring asks optimal_departure for the same few body pairs at many
+# epochs close to the system entry time. A LegSurfaces tabulates, for every
+# ordered pair, the travel time T(t + w) for t in [entry, entry + span_days]
+# and every wait w of the departure grid, so an optimal_departure within the
+# window becomes a linear interpolation and an argmin over the waits.
+#
+# Leaving at once costs at most max T(t) over the window, so waits longer
+# than that can never win and are left out of a pair's table (inside a
+# system that is usually every wait but zero).
+#
+# The grid over t is shared by the waits of a pair and refined adaptively:
+# an interval is split while the linear interpolant misses the solved travel
+# time at its midpoint by more than tolerance_s for any wait. All epochs of a
+# refinement round go through one batched travel-time solve per pair.
+# Tables are rebuilt when a system is entered outside its current window.
+# Epochs are TDB seconds past J2000, like the rest of trytour; the grids
+# are in days after the window start.
+#
+# With DEPARTURE_SEARCH = 'adaptive' the departure is not on the wait grid:
+# given max_wait_days, only the wait-0 row is tabulated and departure()
+# minimizes w + T(t + w) over every wait w up to min(max_wait_days, T(t)),
+# exactly on the interpolant (its minimum is at w = 0, at a grid point or at
+# the end of the window). That is the same search optimal_departure_adaptive
+# runs, to the tables' tolerance instead of DEPARTURE_RESOLUTION_S; a wait
+# window running past the table is a miss and goes to optimal_departure.
+#
+# build_map, when given, builds the tables of a system elsewhere, e.g. one
+# pair per worker of trytour's pool; snapshot()/adopt() hand a system's
+# tables to another process so it scores routes from the same numbers.
+#
+# Large systems are lazy: a pair gets its table for the k-th span_days
+# window after the entry only when a departure in that window is first
+# asked for, so the tables follow a route that takes weeks and pairs the
+# solver never considers are never solved.
+# ------------------------------------------------------------------------------
+
+class PairSurface:
+    def __init__(self, waits, grid, travel):
+        self.waits = waits  # (W,) days, the waits that can win
+        self.grid = grid  # (M,) days after the window start
+        self.travel = travel  # (W, M) seconds
+
+    def lookup(self, x):
+        """Travel time for every wait, departing x days into the window."""
+        i = min(max(int(np.searchsorted(self.grid, x, side='right')) - 1, 0), len(self.grid) - 2)
+        s = (x - self.grid[i]) / (self.grid[i + 1] - self.grid[i])
+        return (1.0 - s) * self.travel[:, i] + s * self.travel[:, i + 1]
+
+class LegSurfaces:
+    def __init__(self, travel_time_batch, wait_days, span_days=10.0, tolerance_s=30.0,
+                 initial_points=17, max_depth=8, max_wait_days=None, build_map=None):
+        self.travel_time_batch = travel_time_batch  # (body1, body2, TDB seconds array) -> seconds
+        self.wait_days = np.asarray([0.0] if max_wait_days is not None else wait_days, dtype=float)
+        self.max_wait_days = max_wait_days  # any wait up to this, instead of the wait_days grid
+        self.build_map = build_map  # ([(from, to, start_s), ...]) -> [(PairSurface, error, solves), ...]
+        self.span_days = span_days
+        self.tolerance_s = tolerance_s
+        self.initial_points = initial_points
+        self.max_depth = max_depth
+        self.systems = {}  # system label -> {'start', 'bodies', 'names', 'lazy', 'tables': {(from, to, window): PairSurface}}
+        self.builds = 0
+        self.tables = 0
+        self.solves = 0
+        self.hits = 0
+        self.misses = 0
+        self.max_error_s = 0.0
+
+    def ensure(self, label, names, bodies, start_s, lazy=False):
+        """
+        Tables for every ordered pair of names, rebuilt unless start_s is
+        in the window (for a lazy system: after its start).
+        """
+        current = self.systems.get(label)
+        if current is not None and set(names) <= current['names'] and self.covers(label, start_s):
+            return False
+        system = {'start': start_s, 'bodies': bodies, 'names': set(names), 'lazy': lazy, 'tables': {}}
+        self.systems[label] = system
+        self.builds += 1
+        pairs = len(names) * (len(names) - 1)
+        if lazy:
+            print(f"{label}: travel-time surfaces for {pairs} legs, built as departures need them")
+            return True
+        max_error = 0.0
+        pairs_list = list(itertools.permutations(names, 2))
+        if self.build_map is not None:
+            for (a, b), (table, error, solves) in zip(pairs_list, self.build_map(
+                    [(a, b, start_s) for a, b in pairs_list])):
+                system['tables'][a, b, 0] = table
+                max_error = max(max_error, error)
+                self.solves += solves
+        else:
+            for a, b in pairs_list:
+                system['tables'][a, b, 0], error = self.build(bodies[a], bodies[b], start_s)
+                max_error = max(max_error, error)
+        self.tables += pairs
+        self.max_error_s = max(self.max_error_s, max_error)
+        points = sum(len(t.grid) for t in system['tables'].values())
+        print(f"{label}: travel-time surfaces for {pairs} legs, {points} grid points,"
+              f" max interpolation error {max_error:.1f} s")
+        return True
+
+    def covers(self, label, start_s):
+        """True when label has tables for departures from start_s (a lazy system builds them as it goes)."""
+        system = self.systems.get(label)
+        if system is None:
+            return False
+        x = (start_s - system['start']) / 86400.0
+        return 0.0 <= x <= self.span_days or (system['lazy'] and x >= 0.0)
+
+    def departure(self, label, from_name, to_name, current_s):
+        """(wait_days, travel_s, total_s) from the tables, or None outside them."""
+        system = self.systems.get(label)
+        known = system is not None and from_name in system['names'] and to_name in system['names']
+        x = (current_s - system['start']) / 86400.0 if known else -1.0
+        window = 0
+        if system is not None and system['lazy'] and x > self.span_days:
+            window = int(x // self.span_days)
+            x -= window * self.span_days
+        if not 0.0 <= x <= self.span_days:
+            self.misses += 1
+            return None
+        table = system['tables'].get((from_name, to_name, window))
+        if table is None:  # lazy system, first departure in this window
+            bodies = system['bodies']
+            table, error = self.build(bodies[from_name], bodies[to_name],
+                                       system['start'] + window * self.span_days * 86400.0)
+            system['tables'][from_name, to_name, window] = table
+            self.tables += 1
+            self.max_error_s = max(self.max_error_s, error)
+        if self.max_wait_days is not None:
+            return self._any_wait(table, x)
+        self.hits += 1
+        travel = table.lookup(x)
+        totals = table.waits * 86400.0 + travel
+        best = int(np.argmin(totals))  # first minimum, like optimal_departure_batch
+        return float(table.waits[best]), float(travel[best]), float(totals[best])
+
+    def stats(self):
+        return {'builds': self.builds, 'tables': self.tables, 'solves': self.solves, 'hits': self.hits,
+                'misses': self.misses, 'max_error_s': self.max_error_s}
+
+    def snapshot(self, label):
+        """The tables of one system without its bodies, for adopt() in another process."""
+        system = self.systems.get(label)
+        if system is None:
+            return None
+        return {key: value for key, value in system.items() if key != 'bodies'}
+
+    def adopt(self, label, snapshot, bodies):
+        """Use a system's tables from snapshot(); tables still missing are built here."""
+        current = self.systems.get(label)
+        if (current is not None and current['start'] == snapshot['start']
+                and snapshot['tables'].keys() <= current['tables'].keys()):
+            return
+        self.systems[label] = dict(snapshot, bodies=bodies, tables=dict(snapshot['tables']))
+
+    def build(self, body1, body2, start_s):
+        """(PairSurface, max interpolation error) for departures from start_s."""
+        surface, error = self._refine(body1, body2, start_s, self.wait_days[:1])
+        longest = np.max(surface.travel[0]) + self.tolerance_s
+        waits = self.wait_days[self.wait_days * 86400.0 <= longest]
+        if len(waits) > 1:
+            surface, error = self._refine(body1, body2, start_s, waits)
+        return surface, error
+
+    # --------------------------------------------------------------------------
+    def _solve(self, body1, body2, start_s, waits, x):
+        # T(start + x + w) for every wait w and grid offset x, in one batch
+        days = (waits[:, None] + x[None, :]).ravel()
+        self.solves += days.size
+        return self.travel_time_batch(body1, body2, start_s + days * 86400.0).reshape(len(waits), len(x))
+
+    def _any_wait(self, table, x):
+        # min of w + T(x + w) for w in [0, min(max_wait_days, T(x))] on the
+        # wait-0 interpolant, which is piecewise linear in w
+        travel_now = table.lookup(x)[0]
+        window = min(self.max_wait_days, travel_now / 86400.0)
+        if x + window > table.grid[-1]:
+            self.misses += 1
+            return None
+        self.hits += 1
+        inside = table.grid[(table.grid > x) & (table.grid < x + window)]
+        waits = np.concatenate([[0.0], inside - x, [window]])
+        travel = np.interp(x + waits, table.grid, table.travel[0])
+        totals = waits * 86400.0 + travel
+        best = int(np.argmin(totals))
+        return float(waits[best]), float(travel[best]), float(totals[best])
+
+    def _refine(self, body1, body2, start_s, waits):
+        grid = np.linspace(0.0, self.span_days, self.initial_points)
+        travel = self._solve(body1, body2, start_s, waits, grid)
+        open_intervals = np.arange(len(grid) - 1)  # left indices still to be checked
+        max_error = 0.0
+        for depth in range(self.max_depth + 1):
+            if open_intervals.size == 0:
+                break
+            mid = 0.5 * (grid[open_intervals] + grid[open_intervals + 1])
+            solved = self._solve(body1, body2, start_s, waits, mid)
+            linear = 0.5 * (travel[:, open_intervals] + travel[:, open_intervals + 1])
+            error = np.max(np.abs(solved - linear), axis=0)
+            split = error > self.tolerance_s
+            if depth == self.max_depth:
+                split[:] = False
+            max_error = max(max_error, float(np.max(error[~split], initial=0.0)))
+            # Insert every midpoint (the solve is paid for), keep the split halves open
+            order = np.argsort(np.concatenate([grid, mid]), kind='stable')
+            position = np.empty_like(order)
+            position[order] = np.arange(len(order))
+            left = position[open_intervals[split]]
+            mid_at = position[len(grid) + np.flatnonzero(split)]
+            grid = np.concatenate([grid, mid])[order]
+            travel = np.concatenate([travel, solved], axis=1)[:, order]
+            open_intervals = np.sort(np.concatenate([left, mid_at]))
+        return PairSurface(waits, grid, travel), max_error
@@ -0,0 +1,171 @@
+from collections import OrderedDict
+import numpy as np
+from numpy.polynomial import chebyshev
+from skyfieldshapes import At
+
+# ------------------------------------------------------------------------------
+# Position cache for trytour.distance
+#
+# Each body is sampled once per segment (segment_days long, indexed by TDB
+# Julian date) and stored as piecewise Chebyshev polynomials. A segment is
+# split in half until the fit is within tolerance_km of the ephemeris at the
+# check points between the interpolation nodes, so fast inner moons simply get
+# shorter pieces. Segments are kept in LRU order; when the cache is full the
+# least recently used segment outside the active time window goes first.
+# ------------------------------------------------------------------------------
+
+class CachedBody:
+    """Wraps a Skyfield body so that .at(time) is answered from the cache."""
+    def __init__(self, cache, key, body):
+        self.cache = cache
+        self.key = key
+        self.body = body
+
+    def at(self, time):
+        return At(self.cache.positions(self.key, self.body, time),
+                  lambda: self.cache.velocities(self.key, self.body, time))
+
+    def __getattr__(self, name):
+        # target, center, names, ... come from the wrapped body
+        return getattr(self.body, name)
+
+    def __repr__(self):
+        return f"<CachedBody {self.key!r} {self.body!r}>"
+
+def chebval_rows(x, c):
+    """Clenshaw evaluation with a coefficient table per point: x (N,), c (N, terms, 3)."""
+    b1 = np.zeros((len(x), c.shape[2]))
+    b2 = np.zeros_like(b1)
+    x2 = 2.0 * x[:, None]
+    for k in range(c.shape[1] - 1, 0, -1):
+        b1, b2 = c[:, k] + x2 * b1 - b2, b1
+    return c[:, 0] + x[:, None] * b1 - b2
+
+class PositionCache:
+    def __init__(self, tolerance_km=1.0, segment_days=1.0, degree=12,
+                 max_depth=10, max_segments=4096):
+        self.tolerance_km = tolerance_km
+        self.segment_days = segment_days
+        self.degree = degree
+        self.max_depth = max_depth
+        self.max_segments = max_segments
+        self.segments = OrderedDict()  # (key, index) -> (starts, ends, coeffs, derivative coeffs)
+        self.window = (-np.inf, np.inf)  # active TDB Julian date range
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.max_error_km = 0.0
+        # Chebyshev nodes on [-1, 1] and the check points halfway between them
+        k = np.arange(degree + 1)
+        self._nodes = np.cos(np.pi * (k + 0.5) / (degree + 1))[::-1]
+        self._checks = 0.5 * (self._nodes[1:] + self._nodes[:-1])
+
+    def wrap(self, key, body):
+        return CachedBody(self, key, body)
+
+    def set_window(self, start_time, end_time=None):
+        # Segments outside [start, end] are the first candidates for eviction
+        start = start_time.tdb if start_time is not None else -np.inf
+        end = end_time.tdb if end_time is not None else np.inf
+        self.window = (start, end)
+
+    def warm(self, key, body, start_time, end_time):
+        # Build every segment covering [start_time, end_time] up front
+        ts = start_time.ts
+        first = int(np.floor(start_time.tdb / self.segment_days))
+        last = int(np.floor(end_time.tdb / self.segment_days))
+        for index in range(first, last + 1):
+            self._segment(key, body, index, ts)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'segments': len(self.segments),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'max_error_km': self.max_error_km,
+        }
+
+    def positions(self, key, body, time):
+        return self._evaluate(key, body, time, False)
+
+    def velocities(self, key, body, time):
+        # km/s, from the derivative of the same fits
+        return self._evaluate(key, body, time, True)
+
+    def _evaluate(self, key, body, time, derivative):
+        if np.ndim(time.tdb) == 0:
+            jd = float(time.tdb)
+            index = int(np.floor(jd / self.segment_days))
+            starts, ends, coeffs, dcoeffs = self._segment(key, body, index, time.ts)
+            p = int(np.searchsorted(starts, jd, side='right')) - 1
+            x = 2.0 * (jd - starts[p]) / (ends[p] - starts[p]) - 1.0
+            if not derivative:
+                return chebyshev.chebval(x, coeffs[p])
+            return chebyshev.chebval(x, dcoeffs[p]) * 2.0 / ((ends[p] - starts[p]) * 86400.0)
+
+        # Gather each epoch's piece, then one vectorized Clenshaw pass
+        jd = time.tdb
+        index = np.floor(jd / self.segment_days).astype(np.int64)
+        x = np.empty(len(jd))
+        span = np.empty(len(jd))
+        rows = np.empty((len(jd), self.degree + 1 - derivative, 3))
+        for seg_index in np.unique(index):
+            mask = index == seg_index
+            starts, ends, coeffs, dcoeffs = self._segment(key, body, int(seg_index), time.ts)
+            piece = np.searchsorted(starts, jd[mask], side='right') - 1
+            span[mask] = ends[piece] - starts[piece]
+            x[mask] = 2.0 * (jd[mask] - starts[piece]) / span[mask] - 1.0
+            rows[mask] = (dcoeffs if derivative else coeffs)[piece]
+        values = chebval_rows(x, rows)
+        if derivative:
+            values *= (2.0 / (span * 86400.0))[:, None]
+        return values.T
+
+    # --------------------------------------------------------------------------
+    def _segment(self, key, body, index, ts):
+        seg_key = (key, index)
+        seg = self.segments.get(seg_key)
+        if seg is not None:
+            self.hits += 1
+            self.segments.move_to_end(seg_key)
+            return seg
+        self.misses += 1
+        start = index * self.segment_days
+        pieces = self._fit(body, ts, start, start + self.segment_days, 0)
+        coeffs = np.array([p[2] for p in pieces])
+        seg = (np.array([p[0] for p in pieces]),
+               np.array([p[1] for p in pieces]),
+               coeffs,
+               chebyshev.chebder(coeffs, axis=1))
+        self.segments[seg_key] = seg
+        if len(self.segments) > self.max_segments:
+            self._evict()
+        return seg
+
+    def _fit(self, body, ts, start, end, depth):
+        half = 0.5 * (end - start)
+        mid = start + half
+        jd = np.concatenate([mid + half * self._nodes, mid + half * self._checks])
+        km = body.at(ts.tdb_jd(jd)).position.km
+        n = len(self._nodes)
+        coeffs = chebyshev.chebfit(self._nodes, km[:, :n].T, self.degree)
+        error = np.max(np.abs(chebyshev.chebval(self._checks, coeffs) - km[:, n:]))
+        if error > self.tolerance_km and depth < self.max_depth:
+            return (self._fit(body, ts, start, mid, depth + 1)
+                    + self._fit(body, ts, mid, end, depth + 1))
+        self.max_error_km = max(self.max_error_km, float(error))
+        return [(start, end, coeffs)]
+
+    def _evict(self):
+        lo, hi = self.window
+        for seg_key in self.segments:
+            seg_start = seg_key[1] * self.segment_days
+            if seg_start + self.segment_days < lo or seg_start > hi:
+                del self.segments[seg_key]
+                break
+        else:
+            self.segments.popitem(last=False)
+        self.evictions += 1
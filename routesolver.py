@@ -0,0 +1,252 @@
+import math
+import random
+import time
+
+# ------------------------------------------------------------------------------
+# Route solvers for the bodies inside one system
+#
+# All solvers work on body names and a leg-cost oracle
+#     leg_cost(from_name, to_name, elapsed_s) -> seconds
+# which returns the wait + travel time of the leg when the traveller is at
+# from_name elapsed_s seconds after entering the system. Times are chained:
+# the next leg is always priced at the arrival time of the previous one.
+#
+# Solvers that can price many legs at once also accept
+#     batch_cost([(from_name, to_name, elapsed_s), ...]) -> [seconds, ...]
+# so the caller can farm the evaluations out (e.g. to a process pool). The
+# requests are issued in a fixed order and the results consumed in that
+# order, so a batch_cost gives exactly the same answer as leg_cost.
+#
+# held_karp_route is exact but exponential in the number of moons; systems
+# with dozens of them go to local_search_route, an anytime heuristic that
+# reports how far its route can at most be from the optimum.
+# ------------------------------------------------------------------------------
+
+def serial_batch(leg_cost):
+    return lambda requests: [leg_cost(*request) for request in requests]
+
+def greedy_route(start, others, leg_cost, batch_cost=None):
+    """Nearest-neighbour route; used as the incumbent for branch-and-bound."""
+    batch_cost = batch_cost or serial_batch(leg_cost)
+    route = [start]
+    remaining = list(others)
+    elapsed = 0.0
+    while remaining:
+        costs = batch_cost([(route[-1], name, elapsed) for name in remaining])
+        best = min(range(len(remaining)), key=costs.__getitem__)
+        elapsed += costs[best]
+        route.append(remaining.pop(best))
+    return route, elapsed
+
+def held_karp_route(start, others, leg_cost, bucket_s=86400.0, upper_bound=None,
+                    batch_cost=None):
+    """
+    Exact time-dependent Held-Karp over (visited subset, last body, arrival bucket).
+    - Within a state only the earliest arrival per bucket_s bucket is kept, so
+      the result is exact up to that time resolution
+    - Labels that cannot beat the best complete route (the greedy route, or
+      upper_bound if it is tighter) are pruned before they are expanded
+    - Returns (route, total_s, stats); route is None only when upper_bound
+      was given and nothing beats it
+    """
+    n = len(others)
+    stats = {'legs_evaluated': 0, 'labels': 0, 'pruned': 0}
+    batch = batch_cost or serial_batch(leg_cost)
+
+    def costs(requests):
+        stats['legs_evaluated'] += len(requests)
+        return batch(requests) if requests else []
+
+    best_route, best_total = None, math.inf
+    if upper_bound is not None:
+        best_total = upper_bound
+    if n:
+        greedy, greedy_total = greedy_route(start, others, None, costs)
+        if greedy_total < best_total:
+            best_route, best_total = greedy, greedy_total
+    else:
+        return [start], 0.0, stats
+
+    # layer[(mask, last)][bucket] = (elapsed, parent); parent = (state, bucket)
+    layer = {(0, -1): {0: (0.0, None)}}
+    history = []
+    for _ in range(n):
+        history.append(layer)
+        # Collect every expansion of the layer, price them in one batch
+        expansions = []
+        for (mask, last), labels in layer.items():
+            frm = start if last < 0 else others[last]
+            for bucket, (elapsed, _) in labels.items():
+                if elapsed >= best_total:
+                    stats['pruned'] += 1
+                    continue
+                for j in range(n):
+                    if not mask & (1 << j):
+                        expansions.append(((mask, last), bucket, elapsed, frm, j))
+        leg_times = costs([(frm, others[j], elapsed)
+                           for _, _, elapsed, frm, j in expansions])
+
+        nxt = {}
+        for ((mask, last), bucket, elapsed, _, j), leg_t in zip(expansions, leg_times):
+            arrive = elapsed + leg_t
+            if arrive >= best_total:
+                stats['pruned'] += 1
+                continue
+            state = (mask | (1 << j), j)
+            b = int(arrive // bucket_s)
+            slot = nxt.setdefault(state, {})
+            if b not in slot or arrive < slot[b][0]:
+                slot[b] = (arrive, ((mask, last), bucket))
+        stats['labels'] += sum(len(v) for v in nxt.values())
+        layer = nxt
+
+    # Best complete label, then walk the parent pointers back to the start
+    final = None
+    for state, labels in layer.items():
+        for bucket, (elapsed, _) in labels.items():
+            if elapsed < best_total:
+                best_total, final = elapsed, (state, bucket)
+    if final is None:
+        return best_route, best_total, stats
+
+    route = []
+    state, bucket = final
+    for depth in range(n, 0, -1):
+        route.append(others[state[1]])
+        labels = layer if depth == n else history[depth]
+        _, parent = labels[state][bucket]
+        state, bucket = parent
+    route.append(start)
+    return route[::-1], best_total, stats
+
+def assignment_bound(start, others, leg_bound):
+    """
+    Lower bound on any route from start through all of others, given a
+    time-independent lower bound leg_bound(from_name, to_name) on each leg:
+    - every body but start is entered exactly once
+    - start and every body but the last are left exactly once
+    """
+    if not others:
+        return 0.0
+    names = [start] + list(others)
+    entering = sum(min(leg_bound(a, b) for a in names if a != b) for b in others)
+    leaving = {a: min((leg_bound(a, b) for b in others if b != a), default=0.0) for a in names}
+    leaving_total = leaving[start] + sum(leaving[b] for b in others) - max(leaving[b] for b in others)
+    return max(entering, leaving_total)
+
+def local_search_route(start, others, leg_cost, time_budget_s=None, seed_route=None,
+                       neighbours=None, lower_bound=None, stale_kicks=50, rng_seed=0):
+    """
+    Anytime heuristic for systems too large for held_karp_route.
+    - Starts from the better of a nearest-neighbour route and seed_route
+    - Improves it with 2-opt (reverse a stretch) and Or-opt (move a stretch
+      of one to three bodies) moves, priced with chained times from the
+      first changed leg on; a candidate is dropped as soon as its partial
+      time reaches the current total
+    - With neighbours ({name: [names]}) only moves that put a body right
+      after one of its neighbours are tried, and the nearest-neighbour route
+      looks at the others only when no neighbour is left
+    - At a local optimum the best route is perturbed (double bridge) and
+      improved again, until time_budget_s runs out or stale_kicks kicks in
+      a row find nothing better
+    - lower_bound(horizon_s) -> seconds, valid for every route that takes
+      at most horizon_s, gives stats['lower_bound'] and stats['gap']
+    Returns (route, total_s, stats).
+    """
+    started = time.monotonic()
+    deadline = math.inf if time_budget_s is None else started + time_budget_s
+    stats = {'legs_evaluated': 0, 'moves': 0, 'kicks': 0, 'out_of_time': False,
+             'lower_bound': None, 'gap': None}
+    everyone = [start] + list(others)
+    if neighbours is None:
+        neighbours = {a: [b for b in everyone if b != a] for a in everyone}
+
+    def arrivals(route, prefix, limit):
+        # Elapsed seconds at each body of route, continuing from the arrivals
+        # at route[:len(prefix)]; None once limit is reached
+        times = list(prefix)
+        for k in range(len(times), len(route)):
+            stats['legs_evaluated'] += 1
+            elapsed = times[-1] + leg_cost(route[k - 1], route[k], times[-1])
+            if elapsed >= limit:
+                return None
+            times.append(elapsed)
+        return times
+
+    def moves(route, begin):
+        # (candidate route, index of its first changed body), from position begin on
+        n = len(route)
+        position = {name: k for k, name in enumerate(route)}
+        for offset in range(n - 1):
+            i = 1 + (begin - 1 + offset) % (n - 1)
+            # 2-opt: route[i..j] reversed, so route[j] follows route[i-1]
+            for name in neighbours[route[i - 1]]:
+                j = position.get(name, 0)
+                if j > i:
+                    yield route[:i] + route[i:j + 1][::-1] + route[j + 1:], i
+            # Or-opt: route[i:i+length] moved to just after one of its first body's neighbours
+            for length in (1, 2, 3):
+                if i + length > n:
+                    break
+                segment = route[i:i + length]
+                rest = route[:i] + route[i + length:]
+                for name in neighbours[route[i]]:
+                    if name in segment:
+                        continue
+                    p = rest.index(name)
+                    if p == i - 1:
+                        continue
+                    yield rest[:p + 1] + segment + rest[p + 1:], min(i, p + 1)
+
+    def improve(route, times):
+        # First-improvement descent to a local optimum (or until the deadline)
+        begin = 1
+        while len(route) > 2:
+            for candidate, first in moves(route, begin):
+                if time.monotonic() >= deadline:
+                    stats['out_of_time'] = True
+                    return route, times
+                candidate_times = arrivals(candidate, times[:first], times[-1])
+                if candidate_times is not None:
+                    route, times, begin = candidate, candidate_times, first
+                    stats['moves'] += 1
+                    break
+            else:
+                break
+        return route, times
+
+    # Nearest neighbour, among each body's neighbours while any are left
+    route, times = [start], [0.0]
+    remaining = list(others)
+    while remaining:
+        candidates = [b for b in neighbours[route[-1]] if b in remaining] or remaining
+        stats['legs_evaluated'] += len(candidates)
+        costs = [leg_cost(route[-1], b, times[-1]) for b in candidates]
+        best = min(range(len(candidates)), key=costs.__getitem__)
+        route.append(candidates[best])
+        times.append(times[-1] + costs[best])
+        remaining.remove(candidates[best])
+    if seed_route is not None and sorted(seed_route) == sorted(everyone) and seed_route[0] == start:
+        seed_times = arrivals(list(seed_route), [0.0], times[-1])
+        if seed_times is not None:
+            route, times = list(seed_route), seed_times
+    route, times = improve(route, times)
+
+    rng = random.Random(rng_seed)
+    stale = 0
+    while len(route) >= 4 and stale < stale_kicks and time.monotonic() < deadline:
+        stats['kicks'] += 1
+        a, b, c = sorted(rng.sample(range(1, len(route) + 1), 3))
+        kicked = route[:a] + route[b:c] + route[a:b] + route[c:]
+        kicked, kicked_times = improve(kicked, arrivals(kicked, times[:a], math.inf))
+        if kicked_times[-1] < times[-1]:
+            route, times, stale = kicked, kicked_times, 0
+        else:
+            stale += 1
+    stats['out_of_time'] = stats['out_of_time'] or time.monotonic() >= deadline
+
+    total = times[-1]
+    if lower_bound is not None:
+        stats['lower_bound'] = min(lower_bound(total), total)
+        stats['gap'] = (total - stats['lower_bound']) / total if total > 0 else 0.0
+    return route, total, stats
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import math
+import os
+import numpy as np
+from bodychain import chain_links
+from legcache import kernel_fingerprint
+from skyfieldshapes import At, tdb_seconds
+
+# ------------------------------------------------------------------------------
+# Ephemeris segments shared by worker processes
+#
+# Every worker of a pool used to open the kernels and build its own Skyfield
+# segments. write_shared_ephemeris decodes the Chebyshev records of the
+# segments the tour's bodies use, for the tour's span only, into one flat
+# float64 .npy file with a small JSON manifest next to it. A worker opens it
+# with SharedEphemeris, which maps the file read-only: the page cache keeps
+# one copy for all workers, and no kernel or Skyfield object is created.
+#
+# Records are stored per segment as (records, coefficients, components) in
+# ascending Chebyshev order, with the segment's start and record length in
+# TDB seconds past J2000, so a segment is evaluated exactly like jplephem
+# evaluates the kernel (SPK types 2 and 3). Bodies from the Horizons store
+# are already memory-mapped .npy files and are only listed in the manifest.
+# The file name is a hash of the kernels and bodies plus the span, so a
+# later run reuses any file that covers its own span (find_shared). A link
+# is stored once per kernel that provides it: two kernels can both have
+# SSB -> Jupiter barycenter, and each body keeps the records of its own
+# kernel, like the Skyfield chain it replaces. Only the
+# KEEP_EXPORTS most recently used files are kept: prune_shared deletes the
+# rest, which does not disturb a process that still maps one.
+#
+# trytour evaluates shared segments directly rather than through its
+# position cache: they already are piecewise Chebyshev series, at the
+# kernels' precision, and refitting them in every worker is exactly the
+# private memory the file is there to avoid. The parent of a pool attaches
+# to the file as well, so it prices legs from the same numbers as its workers.
+# ------------------------------------------------------------------------------
+
+SPK_TYPES = (2, 3)  # Chebyshev position (velocity by differentiation), position and velocity
+SPAN_MARGIN_S = 86400.0  # extra time exported before the span
+KEEP_EXPORTS = 3  # ~60 MB each for the default tour
+SHARED_FORMAT = 2  # bump when the file or manifest layout changes (2: links keyed by kernel)
+
+def chebyshev(c, s, derivative=False):
+    """
+    sum_k c[..., k, :] T_k(s) and, if asked for, its derivative in s, as
+    (components,) or (components, N) like Skyfield; c is (coefficients,
+    components) for a scalar s, (N, coefficients, components) for an array.
+    """
+    if np.ndim(s) == 0:
+        # One epoch: the basis in Python floats, then a single product
+        s = float(s)
+        basis, slopes = [1.0, s], [0.0, 1.0]
+        for _ in range(2, len(c)):
+            basis.append(2.0 * s * basis[-1] - basis[-2])
+            slopes.append(2.0 * basis[-2] + 2.0 * s * slopes[-1] - slopes[-2])
+        value = np.dot(basis[:len(c)], c)
+        return value, np.dot(slopes[:len(c)], c) if derivative else None
+    # Clenshaw's recurrence, differentiated alongside
+    s = s[:, None]
+    b1 = b2 = d1 = d2 = 0.0
+    for k in range(c.shape[-2] - 1, 0, -1):
+        if derivative:
+            d1, d2 = 2.0 * b1 + 2.0 * s * d1 - d2, d1
+        b1, b2 = c[:, k, :] + 2.0 * s * b1 - b2, b1
+    value = (c[:, 0, :] + s * b1 - b2).T
+    return value, (b1 + s * d1 - d2).T if derivative else None
+
+class SharedSegment:
+    """target relative to center from the shared records; answers .at(t) like a Skyfield segment."""
+    def __init__(self, center, target, init, intlen, records, data_type):
+        self.center = center
+        self.target = target
+        self.init = init  # TDB seconds past J2000 at the start of records[0]
+        self.intlen = intlen  # seconds per record
+        self.records = records  # (records, coefficients, components), a view of the map
+        self.data_type = data_type
+
+    def _locate(self, t):
+        index, offset = np.divmod(tdb_seconds(t) - self.init, self.intlen)
+        n = len(self.records)
+        if np.any(index < 0) or np.any(index > n):
+            raise ValueError(f"{self.center}->{self.target}: epoch outside the shared span, TDB seconds "
+                             f"{self.init:.0f} to {self.init + n * self.intlen:.0f}")
+        last = index == n
+        index = np.where(last, n - 1, index).astype(int)
+        offset = np.where(last, offset + self.intlen, offset)
+        return self.records[index], 2.0 * offset / self.intlen - 1.0
+
+    def at(self, t):
+        c, s = self._locate(t)
+        if self.data_type == 3:
+            value, _ = chebyshev(c, s)
+            return At(value[:3], lambda: value[3:])
+        value, rate = chebyshev(c, s, derivative=True)
+        return At(value, lambda: rate * (2.0 / self.intlen))
+
+class SharedBody:
+    def __init__(self, name, target, segments):
+        self.name = name
+        self.target = target
+        self.vector_functions = segments  # barycenter first, for bodychain
+
+    def at(self, t):
+        ats = [segment.at(t) for segment in self.vector_functions]
+        return At(sum(a.position.km for a in ats), lambda: sum(a.velocity.km_per_s for a in ats))
+
+def _prefix(kernel_paths, names):
+    blob = json.dumps({'format': SHARED_FORMAT, 'kernels': kernel_fingerprint(kernel_paths),
+                       'names': sorted(names)}, sort_keys=True)
+    return f".shared-{hashlib.sha1(blob.encode()).hexdigest()[:16]}_"
+
+def shared_path(directory, kernel_paths, names, start_s, end_s):
+    return os.path.join(directory, f"{_prefix(kernel_paths, names)}{math.floor(start_s)}_{math.ceil(end_s)}.npy")
+
+def find_shared(directory, kernel_paths, names, start_s, end_s):
+    """A complete export of these kernels and bodies covering [start_s, end_s], or None."""
+    prefix = _prefix(kernel_paths, names)
+    for entry in sorted(os.listdir(directory)):
+        if not (entry.startswith(prefix) and entry.endswith('.npy.json')):
+            continue
+        first, last = (int(x) for x in entry[len(prefix):-len('.npy.json')].split('_'))
+        if first <= start_s and end_s <= last:
+            path = os.path.join(directory, entry[:-len('.json')])
+            try:
+                os.utime(path + '.json')  # most recently used, for prune_shared
+            except FileNotFoundError:
+                continue  # pruned by another run meanwhile
+            return path
+    return None
+
+def prune_shared(directory, keep=KEEP_EXPORTS):
+    """Delete all but the keep most recently used exports in directory."""
+    manifests = []
+    for entry in os.listdir(directory):
+        if entry.startswith('.shared-') and entry.endswith('.npy.json'):
+            try:
+                manifests.append((os.path.getmtime(os.path.join(directory, entry)), entry))
+            except FileNotFoundError:
+                pass
+    for _, entry in sorted(manifests, reverse=True)[keep:]:
+        path = os.path.join(directory, entry[:-len('.json')])
+        for name in (path + '.json', path):  # the manifest first: without it the file is never used
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+def write_shared_ephemeris(path, raw_bodies, start_s, end_s, kernel_paths, horizons_store=None):
+    """
+    Decode the segments of raw_bodies ({name: body as loaded}) for
+    [start_s, end_s] into path and its manifest. Returns the segments
+    ('center->target') that cannot be shared, not being SPK type 2/3
+    Chebyshev records; nothing is written unless that list is empty.
+    """
+    segments = {}  # (kernel path, center, target) -> (init, intlen, records, data_type)
+    manifest = {'kernel_paths': list(kernel_paths), 'segments': [], 'bodies': {}, 'coverage': {}}
+    unsupported = []
+    for name, body in raw_bodies.items():
+        if horizons_store is not None and horizons_store.resolve(name) and body is horizons_store.body(name):
+            manifest['bodies'][name] = {'target': int(body.target), 'horizons': True}
+            manifest['coverage'][name] = list(horizons_store.coverage(name))
+            continue
+        links = [(getattr(getattr(segment, 'ephemeris', None), 'path', ''), center, target, segment)
+                 for center, target, segment in chain_links(body)]
+        first, last = -np.inf, np.inf
+        for kernel, center, target, segment in links:
+            spk = getattr(segment, 'spk_segment', None)
+            if spk is None or spk.data_type not in SPK_TYPES:
+                if f"{center}->{target}" not in unsupported:
+                    unsupported.append(f"{center}->{target}")
+                continue
+            if (kernel, center, target) not in segments:
+                init, intlen, coefficients = spk._data  # (coefficients, components, records), highest first
+                n = coefficients.shape[2]
+                i0 = int(np.clip(np.floor((start_s - SPAN_MARGIN_S - init) / intlen), 0, n - 1))
+                i1 = int(np.clip(np.ceil((end_s - init) / intlen), i0 + 1, n))
+                records = np.transpose(coefficients[::-1, :, i0:i1], (2, 0, 1))
+                segments[kernel, center, target] = (init + i0 * intlen, intlen, records, spk.data_type)
+            init, intlen, records, _ = segments[kernel, center, target]
+            first, last = max(first, init), min(last, init + len(records) * intlen)
+        manifest['bodies'][name] = {'target': int(body.target),
+                                    'links': [[k, int(c), int(t)] for k, c, t, _ in links]}
+        manifest['coverage'][name] = [2451545.0 + first / 86400.0, 2451545.0 + last / 86400.0]
+    if unsupported:
+        return unsupported
+
+    size = sum(records.size for _, _, records, _ in segments.values())
+    data = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=np.float64, shape=(size,))
+    offset = 0
+    for (kernel, center, target), (init, intlen, records, data_type) in segments.items():
+        data[offset:offset + records.size] = records.ravel()
+        manifest['segments'].append({'kernel': kernel, 'center': int(center), 'target': int(target), 'init': float(init),
+                                     'intlen': float(intlen), 'offset': offset,
+                                     'shape': list(records.shape), 'data_type': int(data_type)})
+        offset += records.size
+    data.flush()
+    del data
+    os.replace(path + '.tmp', path)
+    with open(path + '.json.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.json.tmp', path + '.json')  # written last: its presence means the file is complete
+    return []
+
+class SharedEphemeris:
+    def __init__(self, path):
+        with open(path + '.json') as f:
+            manifest = json.load(f)
+        self.path = path
+        self.kernel_paths = manifest['kernel_paths']
+        self.data = np.load(path, mmap_mode='r')
+        self.segments = {}  # (kernel path, center, target) -> SharedSegment
+        for entry in manifest['segments']:
+            count = int(np.prod(entry['shape']))
+            records = self.data[entry['offset']:entry['offset'] + count].reshape(entry['shape'])
+            self.segments[entry['kernel'], entry['center'], entry['target']] = SharedSegment(
+                entry['center'], entry['target'], entry['init'], entry['intlen'], records, entry['data_type'])
+        self.entries = manifest['bodies']
+        self.covered = manifest['coverage']
+        self.names = list(self.entries)
+
+    def body(self, name):
+        """The body from the shared records, or None for one the Horizons store has."""
+        entry = self.entries[name]
+        if entry.get('horizons'):
+            return None
+        return SharedBody(name, entry['target'], [self.segments[tuple(link)] for link in entry['links']])
+
+    def coverage(self, name):
+        """(first, last) TDB Julian dates the shared records cover, like KernelIndex.coverage."""
+        return tuple(self.covered[name])
+
+    def nbytes(self):
+        return self.data.nbytes
@@ -0,0 +1,32 @@
+# ------------------------------------------------------------------------------
+# Skyfield-shaped results for the stand-in bodies
+#
+# The position cache, body chains, shared ephemeris, Horizons store, SPICE
+# backend, tour service client and the benchmark's synthetic bodies all
+# answer .at(t) like a Skyfield body: .position.km, and .velocity.km_per_s
+# computed only when asked for. They share these classes, and the one
+# conversion from a Skyfield Time to TDB seconds past J2000 (SPICE's
+# ephemeris time) that trytour keeps its epochs in.
+# ------------------------------------------------------------------------------
+
+class Position:
+    def __init__(self, km):
+        self.km = km
+
+class Velocity:
+    def __init__(self, km_per_s):
+        self.km_per_s = km_per_s
+
+class At:
+    """.position.km now, .velocity.km_per_s from the velocity callable when first used."""
+    def __init__(self, km, velocity=None):
+        self.position = Position(km)
+        self._velocity = velocity
+
+    @property
+    def velocity(self):
+        return Velocity(self._velocity())
+
+def tdb_seconds(t):
+    # From the two-part Julian date, whole days first
+    return ((t.whole - 2451545.0) + t.tdb_fraction) * 86400.0
@@ -0,0 +1,214 @@
+import argparse
+import csv
+import io
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+import trytour
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# ------------------------------------------------------------------------------
+# Parameter sweep over start dates, accelerations and wait-window settings
+#
+# Every combination is one full tour. Runs are spread over a process pool;
+# the parent decodes the segments for all start dates once and every worker
+# maps them (trytour.export_shared_ephemeris), and all workers share the
+# on-disk leg cache (its entries are keyed by the constants, so runs with
+# equal settings reuse each other's legs).
+# Results stream into two tables as runs finish: one row per run and one
+# row per leg, written as Parquet when pyarrow is installed, CSV otherwise.
+#
+#     python sweep.py --start 2025-01-01 --end 2026-01-01 --step-days 7 \
+#         --accelerations 0.5,1,2 --workers 8 --output sweep
+# ------------------------------------------------------------------------------
+
+RUN_COLUMNS = [
+    ('run', 'int'), ('start_date', 'str'), ('acceleration', 'float'),
+    ('max_wait_days', 'int'), ('wait_interval_days', 'int'), ('tour', 'str'),
+    ('final_arrival_utc', 'str'), ('total_days', 'float'), ('legs', 'int'),
+    ('wall_s', 'float'), ('error', 'str'),
+]
+LEG_COLUMNS = [
+    ('run', 'int'), ('leg', 'int'), ('System', 'str'), ('From', 'str'), ('To', 'str'),
+    ('Departure UTC', 'str'), ('Travel Time (days)', 'float'),
+    ('Max Speed (m/s)', 'float'), ('Arrival UTC', 'str'),
+]
+UTC_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class TableWriter:
+    """Appends rows to <stem>.parquet (pyarrow) or <stem>.csv, flushing every batch_rows."""
+    def __init__(self, stem, columns, batch_rows=1000):
+        self.columns = columns
+        self.batch_rows = batch_rows
+        self.pending = []
+        if pa is not None:
+            types = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+            self.schema = pa.schema([(name, types[kind]) for name, kind in columns])
+            self.path = stem + '.parquet'
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            self.path = stem + '.csv'
+            self.file = open(self.path, 'w', newline='')
+            self.writer = csv.DictWriter(self.file, [name for name, _ in columns])
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.pending.extend(rows)
+        if len(self.pending) >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        if pa is not None:
+            self.writer.write_table(pa.Table.from_pylist(self.pending, schema=self.schema))
+        else:
+            self.writer.writerows(self.pending)
+            self.file.flush()
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        if pa is not None:
+            self.writer.close()
+        else:
+            self.file.close()
+
+def sweep_grid(start_dates, accelerations, max_wait_days, wait_interval_days):
+    """
+    One dict per run, start dates innermost so consecutive runs share
+    constants (a worker then keeps its leg cache open between them).
+    """
+    runs = []
+    for acceleration, max_wait, interval in itertools.product(
+            accelerations, max_wait_days, wait_interval_days):
+        for start in start_dates:
+            runs.append({'run': len(runs), 'start_date': start, 'acceleration': acceleration,
+                         'max_wait_days': max_wait, 'wait_interval_days': interval})
+    return runs
+
+def run_tour(run, global_order=False):
+    """Fly one tour in this process; returns (run row, leg rows)."""
+    settings = {'ACCELERATION': run['acceleration'], 'MAX_WAIT_DAYS': run['max_wait_days'],
+                'WAIT_INTERVAL_DAYS': run['wait_interval_days']}
+    if any(getattr(trytour, name) != value for name, value in settings.items()):
+        vars(trytour).update(settings)
+        trytour.open_leg_cache()  # the cache key includes these constants
+        trytour.open_leg_surfaces()  # so do the tables' wait offsets
+    trytour.reset_itinerary()
+
+    row = dict(run, tour='global' if global_order else 'sequential', final_arrival_utc=None,
+               total_days=None, legs=0, wall_s=None, error=None)
+    start = datetime.strptime(run['start_date'], '%Y-%m-%d')
+    start_time = trytour.ts.utc(start.year, start.month, start.day)
+    problems = trytour.check_coverage(start_time, start_time + trytour.TOUR_HORIZON_DAYS)
+    if problems:
+        row['error'] = '; '.join(problems)
+        return row, []
+
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):  # the tour is chatty
+        if global_order:
+            trytour.global_tour(trytour.tdb_seconds(start_time))
+        else:
+            trytour.sequential_tour(trytour.tdb_seconds(start_time))
+    row['wall_s'] = time.perf_counter() - started
+
+    legs = [dict(leg, run=run['run'], leg=i) for i, leg in enumerate(trytour.itinerary_rows())]
+    row['legs'] = len(legs)
+    if legs:
+        arrival = legs[-1]['Arrival UTC']
+        row['final_arrival_utc'] = arrival
+        row['total_days'] = (datetime.strptime(arrival, UTC_FORMAT) - start).total_seconds() / 86400
+    return row, legs
+
+def date_seconds(text):
+    start = datetime.strptime(text, '%Y-%m-%d')
+    return trytour.tdb_seconds(trytour.ts.utc(start.year, start.month, start.day))
+
+def sweep(runs, output, workers=1, global_order=False):
+    """Run every tour in runs and stream the results to output.{runs,legs}.*"""
+    run_table = TableWriter(output + '.runs', RUN_COLUMNS, batch_rows=100)
+    leg_table = TableWriter(output + '.legs', LEG_COLUMNS)
+    started = time.perf_counter()
+
+    def done(count, row, legs):
+        run_table.write([row])
+        leg_table.write(legs)
+        rate = count / (time.perf_counter() - started)
+        eta = (len(runs) - count) / rate
+        result = row['error'] or f"{row['total_days']:.2f} days"
+        print(f"[{count}/{len(runs)}] {row['start_date']} a={row['acceleration']}"
+              f" wait={row['max_wait_days']}/{row['wait_interval_days']}: {result}"
+              f"  ({rate*60:.1f} runs/min, ETA {eta/60:.1f} min)")
+
+    try:
+        if workers > 1:
+            settings = {name: getattr(trytour, name) for name in trytour.WORKER_SETTINGS}
+            shared = None
+            if trytour.SHARED_EPHEMERIS:
+                trytour.load_ephemerides(verbose=False)
+                first, last = min(r['start_date'] for r in runs), max(r['start_date'] for r in runs)
+                end_days = trytour.TOUR_HORIZON_DAYS + max(r['max_wait_days'] for r in runs)
+                shared = trytour.export_shared_ephemeris(
+                    date_seconds(first), date_seconds(last) + end_days * 86400.0)
+            with ProcessPoolExecutor(max_workers=workers, initializer=trytour.init_worker,
+                                     initargs=(settings, shared)) as pool:
+                futures = [pool.submit(run_tour, run, global_order) for run in runs]
+                for count, future in enumerate(as_completed(futures), start=1):
+                    done(count, *future.result())
+        else:
+            trytour.load_ephemerides(verbose=False)
+            for count, run in enumerate(runs, start=1):
+                done(count, *run_tour(run, global_order))
+    finally:
+        run_table.close()
+        leg_table.close()
+        if trytour.leg_cache is not None:
+            trytour.leg_cache.close()
+            trytour.leg_cache = None
+    print(f"Wrote {run_table.path} and {leg_table.path}")
+
+def floats(text):
+    return [float(x) for x in text.split(',')]
+
+def ints(text):
+    return [int(x) for x in text.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep tours over start dates and settings.")
+    parser.add_argument('--start', default='2025-01-01', help="first start date, YYYY-MM-DD")
+    parser.add_argument('--end', default=None, help="last start date (default: --start only)")
+    parser.add_argument('--step-days', type=int, default=1)
+    parser.add_argument('--accelerations', type=floats, default=[trytour.ACCELERATION],
+                        help="comma-separated, m/s²")
+    parser.add_argument('--max-wait', type=ints, default=[trytour.MAX_WAIT_DAYS],
+                        help="comma-separated MAX_WAIT_DAYS values")
+    parser.add_argument('--wait-interval', type=ints, default=[trytour.WAIT_INTERVAL_DAYS],
+                        help="comma-separated WAIT_INTERVAL_DAYS values")
+    parser.add_argument('--global-order', action='store_true',
+                        help="search the system order for every run (see trytour --global-order)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default='sweep', help="output path stem")
+    args = parser.parse_args()
+
+    first = date.fromisoformat(args.start)
+    last = date.fromisoformat(args.end) if args.end else first
+    start_dates = [(first + timedelta(days=d)).isoformat()
+                   for d in range(0, (last - first).days + 1, args.step_days)]
+    runs = sweep_grid(start_dates, args.accelerations, args.max_wait, args.wait_interval)
+    if pa is None:
+        print("pyarrow is not installed, writing CSV instead of Parquet")
+    print(f"Sweeping {len(runs)} tours on {args.workers} worker(s)")
+    sweep(runs, args.output, args.workers, args.global_order)
+
+if __name__ == '__main__':
+    main()
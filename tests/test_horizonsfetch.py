@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pytest
+import horizonsstore
+from horizonsfetch import HorizonsFetcher, elements_query, vectors_query, target_name
+
+# ------------------------------------------------------------------------------
+# HorizonsFetcher and HorizonsStore.ingest against a local stand-in for the
+# Horizons API: it answers VECTORS queries for a body on a circular orbit,
+# "No ephemeris for target" for MISSING, and the HTTP status codes queued
+# in `failures` before any of that.
+# ------------------------------------------------------------------------------
+
+MISSING = '999999'
+RADIUS_KM = 1.0e6
+PERIOD_DAYS = 2.0
+
+def orbit(jd):
+    """(km, km/s) of the stand-in body at TDB Julian dates jd."""
+    w = 2 * np.pi / PERIOD_DAYS
+    angle = w * (np.asarray(jd) - 2451545.0)
+    km = RADIUS_KM * np.stack([np.cos(angle), np.sin(angle), np.zeros_like(angle)])
+    km_per_s = RADIUS_KM * w / 86400.0 * np.stack([-np.sin(angle), np.cos(angle), np.zeros_like(angle)])
+    return km, km_per_s
+
+def vectors_result(params):
+    start = float(params['START_TIME'].split()[1])
+    stop = float(params['STOP_TIME'].split()[1])
+    step = float(params['STEP_SIZE'].rstrip('m')) / 1440.0
+    jd = start + step * np.arange(int(round((stop - start) / step)) + 1)
+    km, km_per_s = orbit(jd)
+    lines = [f"{t:.9f}, A.D. calendar, " + ", ".join(f"{x:.12e}" for x in (*p, *v)) + ","
+             for t, p, v in zip(jd, km.T, km_per_s.T)]
+    return ("Target body name: Stand-in (" + params['COMMAND'] + ") {source: test}\n"
+            "$$SOE\n" + "\n".join(lines) + "\n$$EOE\n")
+
+class StandIn(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        with server.lock:
+            server.seen.append(params)
+            status = server.failures.pop(0) if server.failures else 200
+        if status != 200:
+            self.send_error(status)
+            return
+        if params['COMMAND'] == MISSING:
+            payload = {'result': "No ephemeris for target \"" + MISSING + "\""}
+        elif params['EPHEM_TYPE'] == 'VECTORS':
+            payload = {'result': vectors_result(params)}
+        else:
+            payload = {'result': "Target body name: Io (501) {source: test}\n$$SOE\n$$EOE\n"}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    httpd.lock = threading.Lock()
+    httpd.seen = []  # query parameters, in arrival order
+    httpd.failures = []  # status codes to answer with before succeeding
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/api/horizons.api"
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def fetcher(server, tmp_path, **kwargs):
+    kwargs.setdefault('backoff_s', 0.0)
+    return HorizonsFetcher(base_url=server.url, cache_dir=str(tmp_path / 'cache'), **kwargs)
+
+def test_retries_server_errors(server, tmp_path):
+    server.failures = [503, 500, 502]
+    f = fetcher(server, tmp_path)
+    assert target_name(f.fetch(elements_query('501', '@599', 2460676.5))) == 'Io (501)'
+    assert len(server.seen) == 4
+    assert f.stats()['retries'] == 3
+
+def test_gives_up_and_caches_nothing(server, tmp_path):
+    server.failures = [503] * 3
+    f = fetcher(server, tmp_path, retries=2)
+    query = elements_query('501', '@599', 2460676.5)
+    with pytest.raises(urllib.error.HTTPError):
+        f.fetch(query)
+    assert len(server.seen) == 3
+    assert f.fetch(query) is not None  # the failure was not cached
+    assert len(server.seen) == 4
+
+def test_client_errors_are_not_retried(server, tmp_path):
+    server.failures = [400]
+    with pytest.raises(urllib.error.HTTPError):
+        fetcher(server, tmp_path).fetch(elements_query('501', '@599', 2460676.5))
+    assert len(server.seen) == 1
+
+def test_missing_bodies_are_cached(server, tmp_path):
+    query = elements_query(MISSING, '@599', 2460676.5)
+    assert fetcher(server, tmp_path).fetch(query) is None
+    again = fetcher(server, tmp_path)
+    assert again.fetch(query) is None
+    assert len(server.seen) == 1 and again.stats()['cache_hits'] == 1
+
+def test_damaged_cache_entries_are_fetched_again(server, tmp_path):
+    queries = [elements_query(str(code), '@599', 2460676.5) for code in (501, 502, 503, 504)]
+    first = fetcher(server, tmp_path)
+    results = first.fetch_many(queries)
+    assert len(server.seen) == 4
+
+    truncated, edited, removed, _ = (first._path(q) for q in queries)
+    with open(truncated, 'r+') as f:
+        f.truncate(10)
+    with open(edited) as f:
+        entry = json.load(f)
+    entry['result'] = entry['result'].replace('Io', 'Xx')
+    with open(edited, 'w') as f:
+        json.dump(entry, f)
+    os.remove(removed)  # as if the first run had stopped before this query
+
+    resumed = fetcher(server, tmp_path)
+    assert resumed.fetch_many(queries) == results
+    assert len(server.seen) == 7
+    assert resumed.stats()['cache_hits'] == 1 and resumed.stats()['damaged'] == 2
+
+def test_ingest_splits_long_spans_into_chunks(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(horizonsstore, 'MAX_ROWS_PER_QUERY', 50)
+    store = horizonsstore.HorizonsStore(str(tmp_path / 'store'))
+    start, stop = 2460676.5, 2460686.5  # 240 steps of 60 min
+    store.ingest('Standin', 999001, start, stop, step_minutes=60, fetcher=fetcher(server, tmp_path))
+    vectors = sorted((q for q in server.seen if q['EPHEM_TYPE'] == 'VECTORS'),
+                     key=lambda q: float(q['START_TIME'].split()[1]))  # fetched concurrently
+    assert len(vectors) == 5
+    # Each chunk starts where the previous one stopped, and the last stops at stop
+    assert [q['START_TIME'] for q in vectors[1:]] == [q['STOP_TIME'] for q in vectors[:-1]]
+    assert float(vectors[-1]['STOP_TIME'].split()[1]) == stop
+
+    entry = store.resolve('Standin')
+    assert entry['intervals'] == 240 and entry['start_jd'] == start
+    states = np.load(store._file(999001, 'states'))
+    assert len(states) == 241  # shared chunk boundaries stored once
+    jd = np.linspace(start, stop, 1001)
+    km, km_per_s = orbit(jd)
+    body = store.body('Standin')
+    assert np.max(np.abs(body.positions_km(jd) - km)) < 1.0
+    assert np.max(np.abs(body.velocities_km_per_s(jd) - km_per_s)) < 1e-3
+
+    # A second ingest of the same span is answered from the cache
+    server.seen.clear()
+    store.ingest('Standin', 999001, start, stop, step_minutes=60, fetcher=fetcher(server, tmp_path))
+    assert server.seen == []
+
+def test_vectors_query_is_content_addressed(server, tmp_path):
+    f = fetcher(server, tmp_path)
+    a = vectors_query('501', '@0', {'start': 2460676.5, 'stop': 2460677.5, 'step': '60m'})
+    b = dict(reversed(list(a.items())))
+    assert f._path(a) == f._path(b)
+    assert f._path(a) != f._path(dict(a, CENTER='@599'))
@@ -0,0 +1,58 @@
+import itertools
+import pytest
+import touroptimizer
+from touroptimizer import beam_search_tour
+
+# ------------------------------------------------------------------------------
+# beam_search_tour on a toy solar system: one-body systems on a line, each
+# drifting at its own speed, so leg costs depend on the departure time.
+# ------------------------------------------------------------------------------
+
+START = {'Home': 0.0, 'A': 5.0, 'B': -3.0, 'C': 9.0, 'D': -7.0, 'E': 2.0}
+DRIFT = {'Home': 0.0, 'A': -0.4, 'B': 0.3, 'C': -0.2, 'D': 0.5, 'E': 0.1}
+SYSTEMS = [(f"{name} System", [name]) for name in 'ABCDE']
+
+def leg_cost(from_name, to_name, elapsed):
+    def x(name):
+        return START[name] + DRIFT[name] * elapsed
+    return abs(x(to_name) - x(from_name)) + 1.0
+
+def system_route(names, entry, elapsed):
+    return [entry], 0.0
+
+def tour_time(order):
+    elapsed, body = 0.0, 'Home'
+    for name in order:
+        elapsed += leg_cost(body, name, elapsed)
+        body = name
+    return elapsed + leg_cost(body, 'Home', elapsed)
+
+def test_wide_beam_finds_the_best_order():
+    total, plan, stats = beam_search_tour('Home', SYSTEMS, leg_cost, system_route, beam_width=1000)
+    best = min(itertools.permutations('ABCDE'), key=tour_time)
+    assert [route[0] for _, route in plan] == list(best)
+    assert total == pytest.approx(tour_time(best))
+    assert stats['pruned'] > 0
+
+def test_reports_the_given_order_before_searching():
+    reports = []
+    total, plan, _ = beam_search_tour('Home', SYSTEMS, leg_cost, system_route, beam_width=2,
+                                      report=lambda total, plan: reports.append((total, plan)))
+    assert [route[0] for _, route in reports[0][1]] == list('ABCDE')
+    assert [t for t, _ in reports] == sorted((t for t, _ in reports), reverse=True)
+    assert reports[-1] == (total, plan)
+
+def test_time_budget_stops_within_one_system_solve(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(touroptimizer.time, 'monotonic', lambda: clock[0])
+
+    def slow_route(names, entry, elapsed):
+        clock[0] += 1.0  # every system solve takes a second
+        return [entry], 0.0
+
+    total, plan, stats = beam_search_tour('Home', SYSTEMS, leg_cost, slow_route, beam_width=3,
+                                          time_budget_s=7.5)
+    assert stats['out_of_time']
+    assert clock[0] <= 7.5 + 1.0
+    assert sorted(route[0] for _, route in plan) == list('ABCDE')
+    assert total == pytest.approx(tour_time([route[0] for _, route in plan]))
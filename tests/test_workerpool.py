@@ -0,0 +1,61 @@
+import collections
+import numpy as np
+import pytest
+import benchmark
+import trytour
+
+# ------------------------------------------------------------------------------
+# What trytour hands to its worker pool, on benchmark.py's Keplerian stand-in
+# bodies. The pool runs each map in this process and counts the calls per
+# worker function, so a search that leaves the pool idle shows up as zero.
+# ------------------------------------------------------------------------------
+
+START_S = trytour.tdb_seconds(trytour.timescale().utc(2025, 1, 1))
+
+class CountingPool:
+    def __init__(self):
+        self.calls = collections.Counter()
+
+    def map(self, fn, *iterables, chunksize=1):
+        self.calls[fn.__name__] += 1
+        return list(map(fn, *iterables))
+
+@pytest.fixture
+def tour(monkeypatch):
+    system = benchmark.synthetic_system(3)
+    earth = benchmark.KeplerBody(399, 1.496e8, 0.0167, 0.0, 0.0, 1.80, 6.24, 365.25)
+    for name, value in [('bodies', {}), ('chain_segments', {}), ('POSITION_CACHE', trytour.POSITION_CACHE),
+                        ('position_cache', trytour.position_cache), ('leg_surfaces', None)]:
+        monkeypatch.setattr(trytour, name, value)  # install() replaces them
+    monkeypatch.setattr(trytour, 'system_order', [('Planet System', list(system))])
+    monkeypatch.setattr(trytour, 'leg_cache', None)
+    benchmark.install(dict(system, Earth=earth), position_cache=False)
+    yield trytour
+    trytour.reset_itinerary()
+
+def with_pool(tour, monkeypatch):
+    pool = CountingPool()
+    monkeypatch.setattr(tour, 'executor', pool)
+    tour.open_leg_surfaces()
+    return pool
+
+def flown(details):
+    return [(d['Route'], d['System Finish']) for d in details]
+
+@pytest.mark.parametrize('entries', ['planet', 'all'])
+def test_global_order_prices_system_legs_on_the_pool(tour, monkeypatch, entries):
+    tour.open_leg_surfaces()
+    serial = flown(tour.global_tour(START_S, beam_width=2, entries=entries))
+    tour.reset_itinerary()
+
+    pool = with_pool(tour, monkeypatch)
+    pooled = flown(tour.global_tour(START_S, beam_width=2, entries=entries))
+    assert pool.calls['worker_leg_cost'] > 0
+    assert pooled == serial
+
+def test_sequential_tour_builds_surfaces_on_the_pool(tour, monkeypatch):
+    pool = with_pool(tour, monkeypatch)
+    tour.sequential_tour(START_S)
+    assert pool.calls['worker_pair_surface'] == 1
+    assert pool.calls['worker_leg_cost'] == 0  # Held-Karp scores from the tables
+    assert tour.leg_surfaces.stats()['hits'] > 0
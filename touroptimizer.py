@@ -0,0 +1,105 @@
+import time
+
+# ------------------------------------------------------------------------------
+# Global tour optimizer: system order and entry/exit bodies
+#
+# Works on names only, through two pluggable oracles:
+#     leg_cost(from_name, to_name, elapsed_s) -> seconds (wait + travel)
+#     system_route(system_bodies, entry, elapsed_s) -> (route, internal_s)
+# elapsed_s is measured from the start of the tour; system_route must return
+# a route over all of system_bodies that starts at entry (its last body is
+# the exit). The result is a plan [(system_name, route), ...] that the
+# caller flies with its own leg machinery.
+# ------------------------------------------------------------------------------
+
+def beam_search_tour(home, systems, leg_cost, system_route, beam_width=3,
+                     entries='all', time_budget_s=None, report=None):
+    """
+    Beam search over (visited systems, current body, elapsed time).
+    - Each state is expanded into every unvisited system, entered at any of
+      its bodies (entries='all') or only at its planet (entries='planet')
+    - The beam_width earliest states survive each level
+    - The incumbent is the best complete tour so far: the systems in the
+      given order to begin with, then after every level the best state
+      completed in that order (entered at the planets); candidates that
+      arrive no earlier than it are pruned
+    - time_budget_s is checked before every system solve; once it has run
+      out the incumbent is returned (only the first one is always finished)
+    - report(total_s, plan) is called whenever a better complete tour is found
+    Returns (total_s, plan, stats); plan is None if no tour has a finite time.
+    """
+    started = time.monotonic()
+    stats = {'states': 0, 'system_solves': 0, 'pruned': 0, 'out_of_time': False}
+    best = [float('inf'), None]
+    solved = {}  # (elapsed, body, index, entry) -> (arrive, route), shared by the beam and the completions
+
+    def out_of_time():
+        if time_budget_s is not None and time.monotonic() - started > time_budget_s:
+            stats['out_of_time'] = True
+        return stats['out_of_time']
+
+    def finish(elapsed, body, plan):
+        total = elapsed + leg_cost(body, home, elapsed)
+        if total < best[0]:
+            best[0], best[1] = total, plan
+            if report is not None:
+                report(total, plan)
+
+    def visit(elapsed, body, index, entry):
+        key = (elapsed, body, index, entry)
+        if key not in solved:
+            name, names = systems[index]
+            arrive = elapsed + leg_cost(body, entry, elapsed)
+            route, internal = system_route(names, entry, arrive)
+            stats['system_solves'] += 1
+            solved[key] = arrive + internal, route
+        return solved[key]
+
+    def complete(elapsed, order, body, plan, budget=True):
+        # The remaining systems in the given order, entered at their planets
+        for index, (name, names) in enumerate(systems):
+            if index in order:
+                continue
+            if budget and out_of_time():
+                return
+            elapsed, route = visit(elapsed, body, index, names[0])
+            body, plan = route[-1], plan + [(name, route)]
+        finish(elapsed, body, plan)
+
+    def expand(beam):
+        # Every successor of the beam that can still beat the incumbent;
+        # complete tours are finished at once. None when out of time.
+        candidates = []
+        for elapsed, order, body, plan in beam:
+            for index, (name, names) in enumerate(systems):
+                if index in order:
+                    continue
+                for entry in (names if entries == 'all' else names[:1]):
+                    if out_of_time():
+                        return None
+                    arrive, route = visit(elapsed, body, index, entry)
+                    stats['states'] += 1
+                    if arrive >= best[0]:
+                        stats['pruned'] += 1
+                        continue
+                    state = (arrive, order + (index,), route[-1], plan + [(name, route)])
+                    if len(state[1]) == len(systems):
+                        finish(state[0], state[2], state[3])
+                    else:
+                        candidates.append(state)
+        return candidates
+
+    # state: (elapsed, order, current body, plan)
+    beam = [(0.0, (), home, [])]
+    complete(*beam[0], budget=False)
+    for _ in range(len(systems) - 1):
+        candidates = expand(beam)
+        if not candidates:  # out of time, or nothing left that can win
+            break
+        # Deterministic: ties broken by the order systems were visited in
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        beam = candidates[:beam_width]
+        complete(*beam[0])
+    else:
+        expand(beam)
+    return best[0], best[1], stats
@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+import numpy as np
+from skyfieldshapes import At, tdb_seconds
+
+# ------------------------------------------------------------------------------
+# Local ephemeris / leg-cost service
+#
+# `python tourservice.py` loads the kernels once (trytour.load_ephemerides)
+# and keeps them, the position cache and the leg cache warm behind a Unix
+# socket. Clients send one JSON object per line and get one back:
+#     {"op": "distance", "from": "Io", "to": "Europa", "tdb_s": [789048069.2]}
+#     -> {"result": [512345678.9]}
+# Epochs travel as TDB seconds past J2000, the time trytour computes in (a
+# double keeps them to a microsecond). "batch" takes a list of such requests
+# and answers them in order. Requests are served one at a time: trytour's
+# caches and counters are process globals.
+#
+# trytour uses the service on its own when the socket answers and the
+# service runs with the same leg settings; notebooks use TourClient:
+#     client = TourClient.connect()
+#     client.travel_time('Io', 'Europa', ts.utc(2025, 3, 1) + np.arange(10.0))
+#     client.travel_time('Io', 'Europa', trytour.tdb_seconds(t0) + 3600.0 * np.arange(24))
+# ------------------------------------------------------------------------------
+
+SOCKET_PATH = 'tourservice.sock'
+
+def encode_time(t):
+    # A Skyfield Time or TDB seconds, scalar or array -> a list of TDB seconds
+    if hasattr(t, 'whole'):
+        t = tdb_seconds(t)
+    return np.atleast_1d(np.asarray(t, dtype=float)).tolist()
+
+def decode_time(seconds):
+    return np.asarray(seconds, dtype=float)
+
+# ------------------------------------------------------------------------------
+# Server
+# ------------------------------------------------------------------------------
+class TourService:
+    def __init__(self, trytour):
+        self.tour = trytour  # the loaded module, so its constants and caches are the ones used
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+
+    def handle(self, request):
+        with self.lock:
+            return self.answer(request)
+
+    def answer(self, request):
+        try:
+            return {'result': self.dispatch(request)}
+        except Exception as e:  # report to the client, keep serving
+            return {'error': f"{type(e).__name__}: {e}"}
+
+    def dispatch(self, request):
+        self.requests += 1
+        op = request['op']
+        if op == 'batch':
+            return [self.answer(r) for r in request['requests']]
+        tour = self.tour
+        if op == 'hello':
+            return {'settings': tour.leg_settings(), 'bodies': sorted(tour.bodies)}
+        if op == 'bodies':
+            return {name: int(tour.bodies[name].target)
+                    for name in request['names'] if name in tour.bodies}
+        if op == 'coverage':
+            start, end = tour.tdb_time(decode_time(request['tdb_s']))
+            return tour.check_coverage(start, end)
+        if op == 'stats':
+            return {'uptime_s': time.time() - self.started, 'requests': self.requests,
+                    'distance_evaluations': tour.distance_evaluations,
+                    'position': tour.position_cache.stats() if tour.POSITION_CACHE else None,
+                    'legs': tour.leg_cache.stats() if tour.leg_cache is not None else None}
+
+        seconds = decode_time(request['tdb_s'])
+        if op == 'position':
+            at = tour.bodies[request['body']].at(tour.tdb_time(seconds))
+            return {'km': np.asarray(at.position.km).T.tolist(),
+                    'km_per_s': np.asarray(at.velocity.km_per_s).T.tolist()}
+        body1, body2 = tour.bodies[request['from']], tour.bodies[request['to']]
+        if op == 'distance':
+            return tour.distance(body1, body2, seconds).tolist()
+        if op == 'travel_time':
+            return tour.travel_time_batch(body1, body2, seconds).tolist()
+        if op == 'optimal_departure':
+            results = []
+            for s in seconds:
+                dep_s, travel_s, total_s = tour.optimal_departure(body1, body2, float(s))
+                results.append({'departure_s': float(dep_s),
+                                'travel_s': float(travel_s), 'total_s': float(total_s)})
+            return results
+        raise ValueError(f"unknown op {op!r}")
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                reply = self.server.service.handle(json.loads(line))
+            except json.JSONDecodeError as e:
+                reply = {'error': f"bad request: {e}"}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+            self.wfile.flush()
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(path=SOCKET_PATH, catalogue=None, include='tour'):
+    import trytour
+    if catalogue:
+        trytour.system_order = trytour.catalogue_systems(trytour.load_catalogue(catalogue), include)
+    trytour.load_ephemerides()
+    if os.path.exists(path):
+        if TourClient.connect(path) is not None:
+            raise SystemExit(f"A service is already listening on {path}")
+        os.remove(path)  # left over from a service that died
+    server = _Server(path, _Handler)
+    server.service = TourService(trytour)
+    print(f"Serving {len(trytour.bodies)} bodies on {path} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+        if trytour.leg_cache is not None:
+            trytour.leg_cache.close()
+
+# ------------------------------------------------------------------------------
+# Client
+# ------------------------------------------------------------------------------
+class RemoteBody:
+    """Stands in for a body in trytour.bodies; the service knows it by name."""
+    def __init__(self, client, name, target):
+        self.client = client
+        self.name = name
+        self.target = target
+
+    def at(self, t):
+        return self.client.position(self.name, t)
+
+class ServiceError(Exception):
+    pass
+
+class TourClient:
+    def __init__(self, path=SOCKET_PATH, timeout_s=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout_s)
+        self.sock.connect(path)
+        self.file = self.sock.makefile('rwb')
+
+    @classmethod
+    def connect(cls, path=SOCKET_PATH):
+        """A client, or None when no service answers on path."""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except OSError:
+            return None
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def request(self, op, **fields):
+        self.file.write(json.dumps(dict(fields, op=op)).encode() + b'\n')
+        self.file.flush()
+        reply = json.loads(self.file.readline())
+        if 'error' in reply:
+            raise ServiceError(reply['error'])
+        return reply['result']
+
+    def batch(self, requests):
+        """[{'op': ..., ...}, ...] answered in one round trip; errors come back as ServiceError objects."""
+        return [ServiceError(r['error']) if 'error' in r else r['result']
+                for r in self.request('batch', requests=requests)]
+
+    # Epoch arguments are Skyfield Times or TDB seconds, scalar or array;
+    # results follow their shape and trytour's units (distances in m, travel
+    # times in s)
+    def hello(self):
+        return self.request('hello')
+
+    def bodies(self, names):
+        return self.request('bodies', names=list(names))
+
+    def coverage(self, start_time, end_time):
+        return self.request('coverage', tdb_s=encode_time(start_time) + encode_time(end_time))
+
+    def stats(self):
+        return self.request('stats')
+
+    def position(self, name, t):
+        result = self.request('position', body=name, tdb_s=encode_time(t))
+        km, km_per_s = np.array(result['km']).T, np.array(result['km_per_s']).T
+        if _is_scalar(t):
+            km, km_per_s = km[:, 0], km_per_s[:, 0]
+        return At(km, lambda: km_per_s)
+
+    def distance(self, from_name, to_name, t):
+        return self._shaped(t, self.request('distance', **{'from': from_name, 'to': to_name},
+                                            tdb_s=encode_time(t)))
+
+    def travel_time(self, from_name, to_name, t):
+        return self._shaped(t, self.request('travel_time', **{'from': from_name, 'to': to_name},
+                                            tdb_s=encode_time(t)))
+
+    def optimal_departure(self, from_name, to_name, seconds):
+        """(departure_s, travel_s, total_s) like trytour.optimal_departure, for scalar TDB seconds."""
+        result = self.request('optimal_departure', **{'from': from_name, 'to': to_name},
+                              tdb_s=encode_time(seconds))[0]
+        return result['departure_s'], result['travel_s'], result['total_s']
+
+    @staticmethod
+    def _shaped(t, values):
+        values = np.array(values)
+        return float(values[0]) if _is_scalar(t) else values
+
+def _is_scalar(t):
+    return np.ndim(t.whole if hasattr(t, 'whole') else t) == 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the tour ephemerides warm behind a Unix socket.")
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    parser.add_argument('--stats', action='store_true', help="print a running service's stats and exit")
+    parser.add_argument('--catalogue', metavar='XLSX', help="serve the bodies of this PlanetsAndMoons workbook")
+    parser.add_argument('--include', choices=['tour', 'all'], default='tour')
+    args = parser.parse_args()
+    if args.stats:
+        client = TourClient.connect(args.socket)
+        if client is None:
+            raise SystemExit(f"No service on {args.socket}")
+        print(json.dumps(client.stats(), indent=1))
+        return
+    serve(args.socket, args.catalogue, args.include)
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,31 @@
 import re
-from astroquery.jplhorizons import Horizons
+from horizonsfetch import HorizonsFetcher, elements_query, target_name
 # obj = Horizons(id='Ceres', location='568', epochs=2458133.33546)
 # print(obj)
 
 
-SOLAR_SYSTEM_BARYCENTRE = '0'
+SOLAR_SYSTEM_BARYCENTRE = '@0'
 epochs=2458133.33546
 
-def show(code):
-    hor = Horizons(id=code, location=SOLAR_SYSTEM_BARYCENTRE, epochs=epochs)
-    table = hor.elements()
-    elements = table[0]
-    # for col in elements.colnames:
-    #     print(col)
-
-    # diam = table['R_mean']
-    name = elements['targetname']
-    # for col in elements.colnames:
-    #     print(col)
-    # print(elements)
-    # diameter = elements['diameter']
+def show(planet, code, text):
+    if text is None:
+        return  # Horizons has no such body
+    name = target_name(text)
     betweenlastbrackets = re.search(r'\((.+)\)', name).group(0)[1:-1]
-    if betweenlastbrackets == planet or betweenlastbrackets == code:
+    if betweenlastbrackets == str(planet) or betweenlastbrackets == code:
         print(planet, name)
-    # , diameter)
 
+# All ~800 queries go out together on the fetcher's thread pool; repeat runs
+# (including the "no such body" answers) come from its disk cache
+fetcher = HorizonsFetcher()
+codes = []
 for planet in range(1,9):
-    print("---------------------------------------")
-    show(str(planet))
-    for moon in range(0,100):
-        show(str(planet*100+moon))
+    codes.append((planet, str(planet)))
+    codes += [(planet, str(planet*100+moon)) for moon in range(0,100)]
+texts = fetcher.fetch_many([elements_query(code, SOLAR_SYSTEM_BARYCENTRE, epochs) for _, code in codes])
+
+for (planet, code), text in zip(codes, texts):
+    if code == str(planet):
+        print("---------------------------------------")
+    show(planet, code, text)
+print(fetcher.stats())
@@ -1,4 +1,4 @@
-from astroquery.jplhorizons import Horizons
+from horizonsfetch import HorizonsFetcher, vectors_query, parse_vectors
 from astropy.coordinates import solar_system_ephemeris, get_body_barycentric
 from astropy.time import Time
 import astropy.units as u
@@ -10,20 +10,18 @@ def get_moon_positions(start_time, end_time):
         # Get barycentric coordinates of Jupiter
         jupiter = get_body_barycentric('599', start_time)
 
-        # Get the positions of the moons
+        # Get the positions of the moons, all queries at once on the fetcher's pool
+        fetcher = HorizonsFetcher()
+        epochs = {'start': start_time.jd, 'stop': end_time.jd, 'step': '1d'}
+        moon_numbers = range(1, 80)  # Assume a maximum of 80 moons
+        texts = fetcher.fetch_many([vectors_query(f'{moon_number}', '@599', epochs)  # Jupiter as the observer
+                                    for moon_number in moon_numbers])
         moon_positions = {}
-        for moon_number in range(1, 80):  # Assume a maximum of 80 moons
-            try:
-                moon = Horizons(id=f'{moon_number}',
-                                epochs={'start': start_time.jd, 'stop': end_time.jd, 'step': '1d'},
-                                location='@599')  # Specify Jupiter as the observer
-                eph = moon.ephemerides(eph_type='vector', refplane='ecliptic', coord_format='rectangular')
-                moon_positions[f'Moon {moon_number}'] = eph[['x', 'y', 'z']].values + jupiter.cartesian.xyz.value
-            except Exception as e:
-                if "ephemeris." in str(e):
-                    break  # No more moons found
-                else:
-                    continue  # Try the next moon
+        for moon_number, text in zip(moon_numbers, texts):
+            if text is None:
+                break  # No more moons found
+            eph = parse_vectors(text)
+            moon_positions[f'Moon {moon_number}'] = eph[:, 1:] + jupiter.xyz.to(u.au).value
 
         return moon_positions
 
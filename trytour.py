@@ -1,33 +1,112 @@
+import io
 import os
+import sys
+import time
+import math
+import heapq
+import argparse
 import itertools
-from skyfield.api import load
-from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext, redirect_stdout
 import numpy as np
-import pandas as pd
+from positioncache import PositionCache
+from legcache import LegCache
+from routesolver import held_karp_route, local_search_route, assignment_bound
+from touroptimizer import beam_search_tour
+from kernelindex import KernelIndex
+from ephemerisbackend import BACKENDS, make_backend
+from instrumentation import Instrumentation
+from horizonsstore import HorizonsStore
+from warmstart import WarmStart, save_run
+from skyfieldshapes import tdb_seconds
+from bodychain import ChainBody, chain_links, relative_state, shared_frame
+from legsurface import LegSurfaces
+from sharedephemeris import SharedEphemeris, find_shared, prune_shared, shared_path, write_shared_ephemeris
+from tourservice import TourClient, RemoteBody, SOCKET_PATH
+from catalogue import load_catalogue, catalogue_systems
 
 # ------------------------------------------------------------------------------
 # 1) LOAD EPHEMERIS FILES
 # ------------------------------------------------------------------------------
-planets = load('de438.bsp')
-
 ephemerides_folder = 'ephemerides'
-bsp_kernels = []
-for fname in os.listdir(ephemerides_folder):
-    if fname.endswith('.bsp'):
-        full_path = os.path.join(ephemerides_folder, fname)
-        print(f"Loading kernel: {full_path}")
-        kernel = load(full_path)
-        bsp_kernels.append(kernel)
+kernel_index = None
+ephemeris = None  # the EPHEMERIS_BACKEND over kernel_index
+horizons_store = None  # bodies no kernel has, ingested with horizonsstore.py
+_timescale = None
+
+def timescale():
+    # Skyfield is imported on first use, not with this module
+    global _timescale
+    if _timescale is None:
+        from skyfield.api import load
+        _timescale = load.timescale()
+    return _timescale
+
+def __getattr__(name):
+    # trytour.ts for the other modules, loaded like timescale()
+    if name == 'ts':
+        return timescale()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-all_kernels = [planets] + bsp_kernels
+# The optimization core keeps time as float TDB seconds past J2000 (SPICE's
+# ephemeris time), scalars or arrays: a Time is only built where positions
+# are needed, one per batch, and UTC strings only for the printed tables.
+# tdb_seconds(t) (from skyfieldshapes) and tdb_time(seconds) convert.
+def tdb_time(seconds):
+    return timescale().tdb_jd(2451545.0, seconds / 86400.0)
+
+def index_kernels(verbose=True):
+    # Kernels are only indexed here; load_body opens the ones it needs
+    from skyfield.api import load
+    planets_path = load.path_to('de438.bsp')
+    if not os.path.exists(planets_path):
+        load('de438.bsp')  # download it once
+    kernel_paths = [planets_path]
+    for fname in os.listdir(ephemerides_folder):
+        if fname.endswith('.bsp'):
+            kernel_paths.append(os.path.join(ephemerides_folder, fname))
+    index_path = os.path.join(ephemerides_folder, '.kernelindex.json')
+    return KernelIndex(kernel_paths, index_path, verbose=verbose)
 
 # ------------------------------------------------------------------------------
 # 2) GLOBAL CONSTANTS
 # ------------------------------------------------------------------------------
 ACCELERATION = 1.0  # m/s² constant
 CONVERGENCE_THRESHOLD = 60  # seconds
+TRAVEL_SOLVER = 'newton'  # bracketed Newton using ephemeris velocities, or 'fixed-point'
+TRAVEL_MAX_ITERATIONS = 20
+TRAVEL_MODEL = 'departure'  # body1 stays where the traveller left it, or 'arrival' (both bodies at the arrival, as originally)
+EPHEMERIS_BACKEND = 'skyfield'  # or 'spice' (spiceypy: furnsh once, spkpos over epoch arrays)
 MAX_WAIT_DAYS = 180
 WAIT_INTERVAL_DAYS = 10
+BATCHED_DEPARTURE_SCAN = True  # evaluate the whole wait window as one Time array
+DEPARTURE_SEARCH = 'grid'  # or 'adaptive' (coarse bracket scan + golden-section refinement)
+DEPARTURE_RESOLUTION_S = 300  # adaptive search stops when brackets are this narrow
+DEPARTURE_COARSE_POINTS = 48  # samples in the adaptive bracket scan
+POSITION_CACHE = True  # answer distance() from piecewise Chebyshev fits
+POSITION_TOLERANCE_KM = 1.0  # ~0.2 s of travel time on the shortest legs, << CONVERGENCE_THRESHOLD
+PLANET_CENTRIC = True  # distances from the segments below the bodies' shared center only
+LEG_CACHE_PATH = 'legcache.sqlite'  # None disables the on-disk leg cache
+LEG_CACHE_MAX_ENTRIES = 500000
+ROUTE_SOLVER = 'held-karp'  # or 'permutations' (original unchained scoring), or 'local-search'
+ROUTE_BUCKET_HOURS = 12  # Held-Karp keeps one label per arrival bucket
+ROUTE_EXACT_MAX_MOONS = 10  # larger systems go to the local-search solver whatever ROUTE_SOLVER says
+ROUTE_TIME_BUDGET_S = 60  # per system, for the local-search solver
+ROUTE_NEIGHBOURS = 8  # local search only puts a body right after one of its nearest orbits
+ROUTE_TOP_K = 10  # candidate routes the permutation solver keeps and prints
+ROUTE_DUMP_ALL = False  # keep and print every candidate instead (memory grows with n!)
+ROUTE_PROGRESS_S = 5.0  # seconds between progress reports while scoring permutations
+ROUTE_BATCH = 5000  # permutations handed to the worker pool at a time
+LEG_SURFACES = True  # score system routes from precomputed travel-time tables
+SURFACE_SPAN_DAYS = 5  # tables cover departures this long after the system entry
+SURFACE_TOLERANCE_S = 30  # grid refined until linear interpolation is this close
+TOUR_HORIZON_DAYS = 365  # every body must have ephemeris coverage this long after the start
+WARM_LEG_TOLERANCE_S = 60  # --warm-start reuses a leg asked for this close to last time
+WARM_ROUTE_TOLERANCE_HOURS = 1  # ... and a system route entered this close to last time
+USE_SERVICE = True  # hand ephemeris work to a running tourservice.py with the same settings
+SHARED_EPHEMERIS = True  # pool workers map one decoded copy of the tour's segments (sharedephemeris.py)
+CATALOGUE = None  # workbook to build system_order from (see catalogue.py); None keeps the list below
+CATALOGUE_INCLUDE = 'tour'  # bodies marked 'Include in Tour', or 'all'
 
 # ------------------------------------------------------------------------------
 # 3) SYSTEM ORDER (PLANET FIRST, THEN MOONS)
@@ -64,271 +143,1250 @@ system_order = [
 # 4) HELPER: load_body
 # ------------------------------------------------------------------------------
 def load_body(name):
-    name_lower = name.lower()
-    has_barycenter = name_lower in [
-        'mercury', 'venus', 'earth', 'mars', 'jupiter', 
-        'saturn', 'uranus', 'neptune', 'pluto'
-    ]
-    possible_labels = []
-    if has_barycenter:
-        possible_labels.append(name_lower + ' barycenter')
-    possible_labels.append(name_lower)
-    possible_labels.append(name_lower.capitalize())
-    possible_labels.append(name.capitalize())
-    possible_labels.append(name.upper())
-
-    for kernel in all_kernels:
-        for label in possible_labels:
-            try:
-                return kernel[label]
-            except KeyError:
-                pass
-    return None
+    # Planets resolve to their barycenter; see kernelindex.BARYCENTER_NAMES
+    body = ephemeris.body(name)
+    if body is None:
+        body = horizons_store.body(name)
+    return body
+
+def check_coverage(start_time, end_time):
+    """Bodies whose ephemeris does not cover [start_time, end_time]."""
+    if service is not None:
+        return service.coverage(start_time, end_time)
+    problems = []
+    for name in bodies:
+        if kernel_index is None:
+            first, last = shared_ephemeris.coverage(name)  # a worker: only the parent's export
+        elif kernel_index.resolve(name):
+            first, last = kernel_index.coverage(name)
+        else:
+            first, last = horizons_store.coverage(name)
+        if start_time.tdb < first or end_time.tdb > last:
+            problems.append(f"{name}: covered {timescale().tdb_jd(first).utc_strftime('%Y-%m-%d')}"
+                            f" to {timescale().tdb_jd(last).utc_strftime('%Y-%m-%d')}")
+    return problems
 
 # ------------------------------------------------------------------------------
 # 5) BUILD BODIES DICTIONARY
 # ------------------------------------------------------------------------------
+position_cache = PositionCache(tolerance_km=POSITION_TOLERANCE_KM)
 bodies = {}
-for system_name, names in system_order:
+leg_surfaces = None  # LegSurfaces when LEG_SURFACES
+service = None  # TourClient when attached to a running tourservice.py
+chain_segments = {}  # ephemeris segment -> (label, wrapped segment), for chain_body
+leg_cache = None
+shared_ephemeris = None  # SharedEphemeris in a pool's parent and workers, see export_shared_ephemeris
+
+def cached(name, obj):
+    if instrumentation is not None:
+        obj = instrumentation.wrap(name, obj)  # count real ephemeris calls, below the cache
+    if not POSITION_CACHE or shared_ephemeris is not None:
+        return obj  # shared segments are Chebyshev records already; see sharedephemeris
+    return position_cache.wrap(name, obj)
+
+def chain_body(name, obj):
+    """
+    obj as a ChainBody whose segments are cached (and counted) one by one:
+    - a segment shared by several chains (SSB -> Jupiter barycenter) is
+      wrapped once and so fitted once for all of them
+    - it is labelled after the first body it ends at, else center->target
+      (numbered when another kernel provides the same link: each body
+      keeps the segment of its own kernel)
+    """
+    links = []
+    for center, target, segment in chain_links(obj):
+        if segment not in chain_segments:
+            label = name if target == obj.target else f"{center}->{target}"
+            taken = sum(1 for other, _ in chain_segments.values() if other.split('#')[0] == label)
+            if taken:
+                label = f"{label}#{taken + 1}"
+            chain_segments[segment] = label, cached(label, segment)
+        links.append((center, target, chain_segments[segment][1]))
+    return ChainBody(name, obj.target, links)
+
+def load_ephemerides(verbose=True):
+    """Load the kernels, resolve every body in system_order and open the leg cache."""
+    global kernel_index, ephemeris, horizons_store, position_cache
+    kernel_index = index_kernels(verbose)
+    if ephemeris is not None:
+        ephemeris.close()
+    ephemeris = make_backend(EPHEMERIS_BACKEND, kernel_index)
+    horizons_store = HorizonsStore(os.path.join(ephemerides_folder, 'horizons'))
+    position_cache = PositionCache(tolerance_km=POSITION_TOLERANCE_KM)
+
+    bodies.clear()
+    chain_segments.clear()
+    wrap = chain_body if PLANET_CENTRIC else cached
+    for system_name, names in system_order:
+        for nm in names:
+            if nm not in bodies:
+                obj = load_body(nm)
+                if obj is None:
+                    print(f"Warning: {nm} not found in any loaded ephemeris file.")
+                else:
+                    bodies[nm] = wrap(nm, obj)
+
+    # Ensure Earth is present (needed for initial/final journeys)
+    if 'Earth' not in bodies:
+        earth_obj = load_body('Earth')
+        if earth_obj:
+            bodies['Earth'] = wrap('Earth', earth_obj)
+    open_leg_cache()
+    open_leg_surfaces()
+
+def attach_service(path=SOCKET_PATH):
+    """Use a running tourservice.py instead of loading the kernels; False if there is none."""
+    global service
+    client = TourClient.connect(path)
+    if client is None:
+        return False
+    if client.hello()['settings'] != leg_settings():
+        print(f"Tour service on {path} runs with other settings, loading the ephemerides here")
+        client.close()
+        return False
+    service = client
+    names = list(dict.fromkeys([nm for _, names in system_order for nm in names] + ['Earth']))
+    targets = client.bodies(names)
+    bodies.clear()
     for nm in names:
-        if nm not in bodies:
-            obj = load_body(nm)
-            if obj is None:
-                print(f"Warning: {nm} not found in any loaded ephemeris file.")
-            else:
-                bodies[nm] = obj
+        if nm in targets:
+            bodies[nm] = RemoteBody(client, nm, targets[nm])
+        else:
+            print(f"Warning: {nm} not found in any loaded ephemeris file.")
+    open_leg_surfaces()
+    print(f"Using the tour service on {path}")
+    return True
+
+def kernel_paths_in_use():
+    if shared_ephemeris is not None:
+        return shared_ephemeris.kernel_paths  # the parent's, so the leg cache key is the same
+    return ephemeris.paths_in_use() + horizons_store.paths_in_use()
+
+def open_leg_cache():
+    """(Re)open the leg cache for the current constants, e.g. after a sweep changes them."""
+    global leg_cache
+    if leg_cache is not None:
+        leg_cache.close()
+    leg_cache = None
+    if LEG_CACHE_PATH:
+        kernel_paths = kernel_paths_in_use()
+        leg_cache = LegCache(LEG_CACHE_PATH, kernel_paths, leg_settings(),
+                             max_entries=LEG_CACHE_MAX_ENTRIES)
+
+def open_leg_surfaces():
+    """Fresh travel-time tables for the current constants (or none)."""
+    global leg_surfaces
+    leg_surfaces = None
+    if LEG_SURFACES:
+        # Same departure search as optimal_departure; tables built on the pool when there is one
+        leg_surfaces = LegSurfaces(travel_time_batch, range(0, MAX_WAIT_DAYS + 1, WAIT_INTERVAL_DAYS),
+                                   SURFACE_SPAN_DAYS, SURFACE_TOLERANCE_S,
+                                   max_wait_days=MAX_WAIT_DAYS if DEPARTURE_SEARCH == 'adaptive' else None,
+                                   build_map=pool_surface_builds if executor is not None else None)
 
-# Ensure Earth is present (needed for initial/final journeys)
-if 'Earth' not in bodies:
-    earth_obj = load_body('Earth')
-    if earth_obj:
-        bodies['Earth'] = earth_obj
+def leg_settings():
+    # Everything a leg's cost depends on besides the ephemerides
+    return {
+        'acceleration': ACCELERATION,
+        'convergence_threshold': CONVERGENCE_THRESHOLD,
+        'travel_solver': TRAVEL_SOLVER,
+        'travel_max_iterations': TRAVEL_MAX_ITERATIONS,
+        'travel_model': TRAVEL_MODEL,
+        'max_wait_days': MAX_WAIT_DAYS,
+        'wait_interval_days': WAIT_INTERVAL_DAYS,
+        'departure_search': DEPARTURE_SEARCH,
+        'departure_resolution_s': DEPARTURE_RESOLUTION_S,
+        'departure_coarse_points': DEPARTURE_COARSE_POINTS,
+        # Shared segments are evaluated as they are, bypassing the position cache
+        'ephemeris': 'kernels' if shared_ephemeris is None else 'shared',
+        'position_cache': POSITION_CACHE and shared_ephemeris is None,
+        'position_tolerance_km': POSITION_TOLERANCE_KM,
+        'planet_centric': PLANET_CENTRIC,
+        'ephemeris_backend': EPHEMERIS_BACKEND,
+    }
 
 # ------------------------------------------------------------------------------
 # 6) DISTANCE & TRAVEL
 # ------------------------------------------------------------------------------
-def distance(body1, body2, time):
-    pos1 = body1.at(time).position.km
-    pos2 = body2.at(time).position.km
-    return np.linalg.norm(pos1 - pos2) * 1e3  # m
+distance_evaluations = 0  # epochs passed through distance(), for reporting
+instrumentation = None  # Instrumentation when run with --report / --profile-system
 
-def travel_time(body1, body2, departure_time):
-    d_initial = distance(body1, body2, departure_time)
+def travel_origin(body1, body2, departures_s):
+    # Where the traveller leaves body1 (km), relative to the center it shares
+    # with body2; None for TRAVEL_MODEL = 'arrival', which moves body1 along
+    if TRAVEL_MODEL == 'arrival':
+        return None
+    km = shared_frame(body1, body2)[0].at(tdb_time(departures_s)).position.km
+    return km + np.zeros((3,) + np.shape(departures_s))  # 0 for a planet above its moon's links
+
+def separation(body1, body2, seconds, origin_km=None, velocity=False):
+    # body1 - body2 (km) and its rate of change (km/s) if asked for; with
+    # origin_km from travel_origin body1 stays there and only body2 moves
+    t = tdb_time(seconds)
+    if origin_km is None:
+        return relative_state(body1, body2, t, velocity)
+    at2 = shared_frame(body1, body2)[1].at(t)
+    return origin_km - at2.position.km, (-at2.velocity.km_per_s if velocity else None)
+
+def distance(body1, body2, seconds, origin_km=None):
+    # TDB seconds, a scalar or an array; the ephemeris gets one Time for all of them
+    global distance_evaluations
+    r, _ = separation(body1, body2, seconds, origin_km)
+    d = np.linalg.norm(r, axis=0) * 1e3  # m
+    distance_evaluations += np.size(d)
+    return d
+
+def range_and_rate(body1, body2, seconds, origin_km=None):
+    # Distance (m) and its rate of change (m/s), from positions and velocities;
+    # the rate is 0 where the bodies coincide (an Earth -> Earth entry leg)
+    global distance_evaluations
+    r, v = separation(body1, body2, seconds, origin_km, velocity=True)
+    d = np.linalg.norm(r, axis=0)
+    distance_evaluations += np.size(d)
+    rate = np.divide(np.sum(r * v, axis=0), d, out=np.zeros_like(d), where=d > 0)
+    return d * 1e3, rate * 1e3
+
+def warn_unconverged(body1, body2, count):
+    print(f"Warning: travel time {body1.target}->{body2.target} did not converge in "
+          f"{TRAVEL_MAX_ITERATIONS} rounds for {count} departure(s)")
+
+def travel_time(body1, body2, departure_s):
+    if service is not None:
+        return service.travel_time(body1.name, body2.name, departure_s)
+    if TRAVEL_SOLVER == 'newton':
+        return float(travel_time_batch(body1, body2, departure_s + np.zeros(1))[0])
+    origin = travel_origin(body1, body2, departure_s)
+    d_initial = distance(body1, body2, departure_s, origin)
     t_estimate = np.sqrt(2.0 * d_initial / ACCELERATION)
-    for _ in range(20):
-        arrival_time = departure_time + timedelta(seconds=t_estimate)
-        d_new = distance(body1, body2, arrival_time)
+    converged = False
+    for iteration in range(1, TRAVEL_MAX_ITERATIONS + 1):
+        d_new = distance(body1, body2, departure_s + t_estimate, origin)
         t_new = np.sqrt(2.0 * d_new / ACCELERATION)
         if abs(t_new - t_estimate) < CONVERGENCE_THRESHOLD:
+            converged = True
             break
         t_estimate = t_new
+    if instrumentation is not None:
+        instrumentation.travel_time(iteration, converged)
+    if not converged:
+        warn_unconverged(body1, body2, 1)
     return t_new
 
-def optimal_departure(body1, body2, current_time):
+def travel_time_batch(body1, body2, departures_s):
+    """
+    travel_time for an array of departures at once: Newton's method
+    (solve_travel_time) with TRAVEL_SOLVER = 'newton', the default, else
+    travel_time's fixed-point iteration. Either way departures that have
+    converged are masked out, so each round only evaluates the ephemeris
+    for the ones still moving.
+    """
+    if service is not None:
+        return service.travel_time(body1.name, body2.name, departures_s)
+    if TRAVEL_SOLVER == 'newton':
+        t, converged, iterations = solve_travel_time(body1, body2, departures_s)
+        if instrumentation is not None:
+            for k in np.unique(iterations):
+                for status in (True, False):
+                    count = int(np.sum((iterations == k) & (converged == status)))
+                    if count:
+                        instrumentation.travel_time(int(k), status, count)
+        if not converged.all():
+            warn_unconverged(body1, body2, int(np.sum(~converged)))
+        return t
+    origin = travel_origin(body1, body2, departures_s)
+    d_initial = distance(body1, body2, departures_s, origin)
+    t_estimate = np.sqrt(2.0 * d_initial / ACCELERATION)
+    t_new = t_estimate.copy()
+    active = np.arange(len(t_estimate))
+    for iteration in range(1, TRAVEL_MAX_ITERATIONS + 1):
+        if active.size == 0:
+            break
+        d_new = distance(body1, body2, departures_s[active] + t_estimate[active],
+                         None if origin is None else origin[:, active])
+        t_new[active] = np.sqrt(2.0 * d_new / ACCELERATION)
+        converged = np.abs(t_new[active] - t_estimate[active]) < CONVERGENCE_THRESHOLD
+        t_estimate[active] = t_new[active]
+        active = active[~converged]
+        if instrumentation is not None:
+            instrumentation.travel_time(iteration, True, int(converged.sum()))
+    if active.size:
+        if instrumentation is not None:
+            instrumentation.travel_time(TRAVEL_MAX_ITERATIONS, False, active.size)
+        warn_unconverged(body1, body2, active.size)
+    return t_new
+
+def solve_travel_time(body1, body2, departures_s):
+    """
+    Newton's method on f(t) = t - sqrt(2 d(t) / a), for an array of departures.
+    - d(t) is the distance from body1 at dep to body2 at dep + t, in the frame
+      of their shared center (TRAVEL_MODEL = 'arrival': both at dep + t);
+      body1 is evaluated once, before the iterations
+    - f'(t) = 1 - d'(t) / (a sqrt(2 d / a)), with d' from body2's velocity
+      (the relative velocity for 'arrival')
+    - f(0) < 0 and f grows without bound, so every evaluation tightens a
+      bracket [lo, hi] around the root; a Newton step that leaves it (or a
+      non-positive slope) falls back to bisection, or to a plain substitution
+      step while no upper end is known
+    - Returns (t, converged, iterations), one entry per departure
+    """
+    n = len(departures_s)
+    origin = travel_origin(body1, body2, departures_s)
+    t = np.sqrt(2.0 * distance(body1, body2, departures_s, origin) / ACCELERATION)
+    lo = np.zeros(n)
+    hi = np.full(n, np.inf)
+    converged = np.zeros(n, dtype=bool)
+    iterations = np.zeros(n, dtype=int)
+    active = np.arange(n)
+    for iteration in range(1, TRAVEL_MAX_ITERATIONS + 1):
+        if active.size == 0:
+            break
+        ta = t[active]
+        d, rate = range_and_rate(body1, body2, departures_s[active] + ta,
+                                 None if origin is None else origin[:, active])
+        g = np.sqrt(2.0 * d / ACCELERATION)
+        f = ta - g
+        slope = 1.0 - np.divide(rate, ACCELERATION * g, out=np.zeros_like(g), where=g > 0)
+        lo[active] = np.where(f < 0, ta, lo[active])
+        hi[active] = np.where(f > 0, ta, hi[active])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = ta - f / slope
+        inside = (slope > 0) & (step >= lo[active]) & (step <= hi[active])
+        fallback = np.where(np.isfinite(hi[active]), 0.5 * (lo[active] + hi[active]), g)
+        t_new = np.where(inside, step, fallback)
+        done = np.abs(t_new - ta) < CONVERGENCE_THRESHOLD
+        t[active] = t_new
+        iterations[active] = iteration
+        converged[active[done]] = True
+        active = active[~done]
+    return t, converged, iterations
+
+def optimal_departure(body1, body2, current_s):
+    # (departure, travel, wait + travel) in seconds, for a traveller at body1 at current_s
+    if warm_start is not None:
+        hit = warm_start.leg(body1.target, body2.target, current_s)
+        if hit is not None:
+            return hit
+    if service is not None:
+        return service.optimal_departure(body1.name, body2.name, current_s)
+    if leg_cache is not None:
+        hit = leg_cache.get(body1.target, body2.target, current_s)
+        if hit is not None:
+            wait_s, t_travel, total = hit
+            return current_s + wait_s, t_travel, total
+    if DEPARTURE_SEARCH == 'adaptive':
+        result = optimal_departure_adaptive(body1, body2, current_s)[:3]
+    elif BATCHED_DEPARTURE_SCAN:
+        result = optimal_departure_batch(body1, body2, current_s)
+    else:
+        result = optimal_departure_scan(body1, body2, current_s)
+    if leg_cache is not None:
+        dep_s, t_travel, total = result
+        leg_cache.put(body1.target, body2.target, current_s, dep_s - current_s, t_travel, total)
+    return result
+
+def optimal_departure_scan(body1, body2, current_s):
     best_total = float('inf')
-    best_dep_time = current_time
+    best_dep_s = current_s
     best_t_travel = 0.0
     for wait_days in range(0, MAX_WAIT_DAYS + 1, WAIT_INTERVAL_DAYS):
-        dep_candidate = current_time + timedelta(days=wait_days)
+        dep_candidate = current_s + wait_days*24*3600
         t_travel = travel_time(body1, body2, dep_candidate)
         total = wait_days*24*3600 + t_travel
         if total < best_total:
             best_total = total
-            best_dep_time = dep_candidate
+            best_dep_s = dep_candidate
             best_t_travel = t_travel
-    return best_dep_time, best_t_travel, best_total
+    return best_dep_s, best_t_travel, best_total
+
+def optimal_departure_batch(body1, body2, current_s):
+    # One array for every candidate departure in the wait window
+    waits_s = np.arange(0, MAX_WAIT_DAYS + 1, WAIT_INTERVAL_DAYS) * 24.0 * 3600
+    t_travel = travel_time_batch(body1, body2, current_s + waits_s)
+    totals = waits_s + t_travel
+    best = int(np.argmin(totals))  # first minimum, like the scalar scan
+    return current_s + waits_s[best], float(t_travel[best]), float(totals[best])
+
+def optimal_departure_adaptive(body1, body2, current_s):
+    """
+    - Leaving at once costs T(0), so no wait longer than T(0) can win: the
+      search window is min(MAX_WAIT_DAYS, T(0))
+    - Coarse scan of DEPARTURE_COARSE_POINTS waits, then golden-section
+      refinement of every local minimum down to DEPARTURE_RESOLUTION_S,
+      all brackets advanced together in one batched evaluation per step
+    - Returns (dep_s, travel_s, total_s, distance evaluations used)
+    """
+    evaluations_before = distance_evaluations
+    waits, travels = [], []
+
+    def total(wait_s):
+        t_travel = travel_time_batch(body1, body2, current_s + wait_s)
+        waits.append(wait_s)
+        travels.append(t_travel)
+        return wait_s + t_travel
+
+    t_now = total(np.zeros(1))[0]
+    window = min(MAX_WAIT_DAYS * 24 * 3600, t_now)
+    grid = np.linspace(0.0, window, DEPARTURE_COARSE_POINTS + 1)[1:]
+    coarse = np.concatenate([[t_now], total(grid)])
+    grid = np.concatenate([[0.0], grid])
+
+    # Brackets around every local minimum of the coarse scan
+    inner = (coarse[1:-1] <= coarse[:-2]) & (coarse[1:-1] <= coarse[2:])
+    minima = np.flatnonzero(np.concatenate([[coarse[0] <= coarse[1]], inner,
+                                            [coarse[-1] < coarse[-2]]]))
+    lo = grid[np.maximum(minima - 1, 0)]
+    hi = grid[np.minimum(minima + 1, len(grid) - 1)]
+
+    invphi = (np.sqrt(5.0) - 1.0) / 2.0
+    c = hi - invphi * (hi - lo)
+    d = lo + invphi * (hi - lo)
+    f = total(np.concatenate([c, d]))
+    fc, fd = f[:len(c)], f[len(c):]
+    while np.max(hi - lo) > DEPARTURE_RESOLUTION_S:
+        left = fc < fd  # minimum is in [lo, d]
+        hi = np.where(left, d, hi)
+        lo = np.where(left, lo, c)
+        new_c = hi - invphi * (hi - lo)
+        new_d = lo + invphi * (hi - lo)
+        f_new = total(np.where(left, new_c, new_d))
+        c, d = np.where(left, new_c, d), np.where(left, c, new_d)
+        fc, fd = np.where(left, f_new, fd), np.where(left, fc, f_new)
+
+    waits = np.concatenate(waits)
+    travels = np.concatenate(travels)
+    best = int(np.argmin(waits + travels))
+    return (current_s + float(waits[best]), float(travels[best]), float(waits[best] + travels[best]),
+            distance_evaluations - evaluations_before)
 
 # ------------------------------------------------------------------------------
 # 7) ITINERARY TRACKING
 # ------------------------------------------------------------------------------
 itinerary = []
+flown_legs = []  # full-precision legs and system solves, for --save-run
+flown_systems = []
+warm_start = None  # WarmStart when run with --warm-start
 
-def record_leg(system_label, from_name, to_name, dep_time, travel_s):
-    arrival_time = dep_time + timedelta(seconds=travel_s)
+def record_leg(system_label, from_name, to_name, dep_s, travel_s, query_s):
+    # query_s is the time optimal_departure was asked for this leg
+    arrival_s = dep_s + travel_s
+    flown_legs.append({
+        'from_id': bodies[from_name].target,
+        'to_id': bodies[to_name].target,
+        'query_s': float(query_s),
+        'departure_s': float(dep_s),
+        'travel_s': float(travel_s),
+    })
     # Simple max speed estimate = a*(travel_s/2)
     max_speed = ACCELERATION * (travel_s / 2.0)
     itinerary.append({
         'System': system_label,
         'From': from_name,
         'To': to_name,
-        'Departure UTC': dep_time.utc_strftime('%Y-%m-%d %H:%M:%S'),
+        'Departure UTC': dep_s,  # TDB seconds until itinerary_rows()
         'Travel Time (days)': travel_s/3600/24,
         'Max Speed (m/s)': max_speed,
-        'Arrival UTC': arrival_time.utc_strftime('%Y-%m-%d %H:%M:%S')
+        'Arrival UTC': arrival_s,
     })
-    return arrival_time
+    return arrival_s
+
+def utc_strings(rows, columns, fmt):
+    # rows with the TDB seconds in columns replaced by UTC strings, one Time per column
+    rows = [dict(row) for row in rows]
+    for column in columns:
+        if rows:
+            seconds = np.array([row[column] for row in rows], dtype=float)
+            for row, text in zip(rows, tdb_time(seconds).utc_strftime(fmt)):
+                row[column] = text
+    return rows
+
+def itinerary_rows():
+    """The itinerary as printed and saved, with UTC times."""
+    return utc_strings(itinerary, ['Departure UTC', 'Arrival UTC'], '%Y-%m-%d %H:%M:%S')
+
+def summary_rows(overall_details):
+    return utc_strings(overall_details, ['System Start', 'System Finish'], '%Y-%m-%d')
+
+def reset_itinerary():
+    itinerary.clear()
+    flown_legs.clear()
+    flown_systems.clear()
 
 # ------------------------------------------------------------------------------
 # 8) OPTIMIZE SYSTEM ROUTE (PLANET FIRST, THEN MOONS)
 # ------------------------------------------------------------------------------
-def optimize_system_route(system_bodies, arrival_time):
+def optimize_system_route(system_bodies, arrival_s):
     """
     - system_bodies[0] is the planet
     - We fix that planet as the first visited body
-    - We permute the remaining bodies (the moons)
-    - Print candidate routes and pick the best
+    - We order the remaining bodies (the moons) with route_solver(moons)
+    - Fly the best route and record its legs
     """
     if len(system_bodies) == 1:
         # only the planet, no moons
-        return system_bodies, arrival_time, 0.0
+        return system_bodies, arrival_s, 0.0
 
     planet = system_bodies[0]
     moons = system_bodies[1:]
 
-    all_candidate_routes = []  # list of (full_route, total_internal_time)
-
-    # Permute the moons only
-    routes = list(itertools.permutations(moons))
-    routecount = len(routes)
-    routenum = 0
-    for perm in routes:
-        routenum += 1
-        print(f"{planet}: Route {routenum} of {routecount}")
-        route = [planet] + list(perm)
-        total_time = 0.0
-        valid = True
-        # compute total time ignoring departure-time chaining
-        current_t = arrival_time
-        for i in range(len(route) - 1):
-            fromB = route[i]
-            toB = route[i+1]
-            if fromB not in bodies or toB not in bodies:
-                valid = False
-                break
-            _, _, leg_t = optimal_departure(bodies[fromB], bodies[toB], current_t)
-            total_time += leg_t
-            # We don't update current_t because we only need the sum
-
-        if valid:
-            all_candidate_routes.append((route, total_time))
-
-    # Sort
-    all_candidate_routes.sort(key=lambda x: x[1])
-
-    print("Candidate routes for this system (planet-first) (sorted by total time):")
-    for route, tval in all_candidate_routes:
+    solver = route_solver(moons)
+    with timed_system(planet, moons=len(moons), solver=solver):
+        reused = warm_start.reuse(system_bodies, arrival_s) if warm_start is not None else None
+        if reused is not None:
+            print(f"{planet}: entry time unchanged, reusing route {reused}")
+            best = reused, None
+        else:
+            if leg_surfaces is not None:
+                leg_surfaces.ensure(planet, [b for b in system_bodies if b in bodies], bodies, arrival_s,
+                                    lazy=solver == 'local-search')
+            seed = None
+            if warm_start is not None and solver != 'permutations':
+                seed = warm_start.seed(system_bodies)
+            if solver == 'held-karp':
+                best = held_karp_system_route(planet, moons, arrival_s, seed)
+            elif solver == 'local-search':
+                best = local_search_system_route(planet, moons, arrival_s, seed)
+            else:
+                best = permutation_system_route(planet, moons, arrival_s)
+        if best is None:
+            return system_bodies, arrival_s, 0.0
+
+        best_route, best_time = best
+        if leg_surfaces is not None:
+            best_time = None  # scored from the tables; take the flown time instead
+        # Now "fly" it to get final arrival_s
+        current_s = fly_route("System: " + system_bodies[0], best_route, arrival_s)
+        if best_time is None:
+            best_time = current_s - arrival_s
+        print(f"   => Best route is {best_route}, total internal time = {best_time/(3600*24):.2f} days\n")
+    flown_systems.append({'planet': planet, 'bodies': list(system_bodies),
+                          'route': list(best_route), 'entry_s': float(arrival_s)})
+    return best_route, current_s, best_time
+
+def timed_system(name, **details):
+    if instrumentation is None:
+        return nullcontext()
+    return instrumentation.system(name, **details)
+
+def fly_route(system_label, route, arrival_s):
+    current_s = arrival_s
+    for i in range(len(route) - 1):
+        fromB = route[i]
+        toB = route[i+1]
+        dep, t_travel, _ = optimal_departure(bodies[fromB], bodies[toB], current_s)
+        current_s = record_leg(system_label, fromB, toB, dep, t_travel, current_s)
+    return current_s
+
+def scored_leg(planet, fromB, toB, current_s):
+    # Wait + travel seconds for route scoring, from the system's tables when built
+    if leg_surfaces is not None:
+        hit = leg_surfaces.departure(planet, fromB, toB, current_s)
+        if hit is not None:
+            return hit[2]
+    _, _, leg_t = optimal_departure(bodies[fromB], bodies[toB], current_s)
+    return leg_t
+
+def route_solver(moons):
+    # Exact solvers only while they stay affordable
+    return 'local-search' if len(moons) > ROUTE_EXACT_MAX_MOONS else ROUTE_SOLVER
+
+def held_karp_system_route(planet, moons, arrival_s, seed=None):
+    # Exact over chained arrival times, so best_time matches the legs flown.
+    # A seed route (e.g. from --warm-start) bounds the search from above.
+    missing = [b for b in [planet] + moons if b not in bodies]
+    if missing:
+        print(f"   No valid routes found, missing: {missing}")
+        return None
+
+    def leg_cost(fromB, toB, elapsed_s):
+        return scored_leg(planet, fromB, toB, arrival_s + elapsed_s)
+
+    batch_cost = None
+    # With tables for this system the pool has built them already; without
+    # (no surfaces, or global_tour's per-entry-body searches) it prices the legs
+    if executor is not None and (leg_surfaces is None or not leg_surfaces.covers(planet, arrival_s)):
+        def batch_cost(requests):
+            jobs = [(fromB, toB, arrival_s + elapsed_s) for fromB, toB, elapsed_s in requests]
+            return list(executor.map(worker_leg_cost, jobs, chunksize=chunksize(len(jobs))))
+
+    upper_bound = None
+    if seed is not None:
+        upper_bound = 0.0
+        for fromB, toB in zip(seed, seed[1:]):
+            upper_bound += leg_cost(fromB, toB, upper_bound)
+    route, total_time, stats = held_karp_route(
+        planet, moons, leg_cost, bucket_s=ROUTE_BUCKET_HOURS * 3600,
+        upper_bound=upper_bound, batch_cost=batch_cost)
+    if route is None:
+        route = seed  # nothing beats the previous route
+    print(f"{planet}: Held-Karp evaluated {stats['legs_evaluated']} legs, "
+          f"{stats['labels']} labels, pruned {stats['pruned']}")
+    return route, total_time
+
+def radial_ranges(center, names, start_s, horizon_s, step_days=0.25):
+    """
+    {name: (min, max)} distance (m) from center over [start_s, start_s + horizon_s],
+    sampled every step_days and widened by the largest change between samples.
+    """
+    days = max(horizon_s / (24 * 3600), step_days)
+    t = start_s + np.linspace(0.0, days, int(np.ceil(days / step_days)) + 1) * (24 * 3600)
+    ranges = {}
+    for name in names:
+        if name == center:
+            ranges[name] = (0.0, 0.0)
+            continue
+        r = distance(bodies[center], bodies[name], t)
+        margin = np.max(np.abs(np.diff(r)))
+        ranges[name] = (max(np.min(r) - margin, 0.0), np.max(r) + margin)
+    return ranges
+
+def local_search_system_route(planet, moons, arrival_s, seed=None, center=None):
+    # Anytime 2-opt / Or-opt search for systems too large for Held-Karp.
+    # Neighbours are the bodies on the closest orbits around center (the
+    # planet); the lower bound holds for any route no longer than the best
+    # one, since no leg is shorter than the gap between the two bodies'
+    # distances from center over that time.
+    center = center or planet
+    names = [planet] + moons
+    missing = [b for b in names + [center] if b not in bodies]
+    if missing:
+        print(f"   No valid routes found, missing: {missing}")
+        return None
+
+    def leg_cost(fromB, toB, elapsed_s):
+        return scored_leg(planet, fromB, toB, arrival_s + elapsed_s)
+
+    def leg_bounds(horizon_s):
+        ranges = radial_ranges(center, names, arrival_s, horizon_s)
+        def leg_bound(fromB, toB):
+            (low1, high1), (low2, high2) = ranges[fromB], ranges[toB]
+            gap = max(low2 - high1, low1 - high2, 0.0)
+            return np.sqrt(2.0 * gap / ACCELERATION)
+        return ranges, leg_bound
+
+    ranges, _ = leg_bounds(0.0)
+    middle = {name: 0.5 * (low + high) for name, (low, high) in ranges.items()}
+    neighbours = {a: sorted((b for b in names if b != a), key=lambda b: abs(middle[b] - middle[a]))[:ROUTE_NEIGHBOURS]
+                  for a in names}
+
+    def lower_bound(horizon_s):
+        return assignment_bound(planet, moons, leg_bounds(horizon_s)[1])
+
+    started = time.perf_counter()
+    route, total_time, stats = local_search_route(
+        planet, moons, leg_cost, ROUTE_TIME_BUDGET_S, seed_route=seed,
+        neighbours=neighbours, lower_bound=lower_bound)
+    print(f"{planet}: local search evaluated {stats['legs_evaluated']} legs, {stats['moves']} moves, "
+          f"{stats['kicks']} kicks in {time.perf_counter() - started:.1f} s"
+          + (" (time budget reached)" if stats['out_of_time'] else ""))
+    print(f"{planet}: lower bound {stats['lower_bound']/(3600*24):.2f} days, "
+          f"gap to it at most {stats['gap']:.1%}")
+    return route, total_time
+
+def route_total_unchained(route, arrival_s):
+    # compute total time ignoring departure-time chaining; None if invalid
+    total_time = 0.0
+    current_s = arrival_s
+    for i in range(len(route) - 1):
+        fromB = route[i]
+        toB = route[i+1]
+        if fromB not in bodies or toB not in bodies:
+            return None
+        total_time += scored_leg(route[0], fromB, toB, current_s)
+        # We don't update current_s because we only need the sum
+    return total_time
+
+def print_route_progress(planet, done, total, elapsed_s):
+    rate = done / elapsed_s
+    print(f"{planet}: {done} of {total} routes ({rate:.0f} routes/s, ETA {(total - done) / rate:.0f} s)")
+
+route_progress = print_route_progress  # callable(planet, done, total, elapsed_s) or None
+
+def scored_routes(routes, arrival_s):
+    # (route, total time or None), consuming routes lazily; the pool gets
+    # ROUTE_BATCH at a time since Executor.map would submit them all at once.
+    # With leg surfaces each job carries the system's tables, so the workers
+    # score from the same numbers as a serial run.
+    if executor is None:
+        for route in routes:
+            yield route, route_total_unchained(route, arrival_s)
+        return
+    while True:
+        batch = list(itertools.islice(routes, ROUTE_BATCH))
+        if not batch:
+            return
+        tables = leg_surfaces.snapshot(batch[0][0]) if leg_surfaces is not None else None
+        size = chunksize(len(batch))
+        jobs = [(batch[i:i + size], arrival_s, tables) for i in range(0, len(batch), size)]
+        yield from zip(batch, itertools.chain.from_iterable(executor.map(worker_route_totals, jobs)))
+
+def permutation_system_route(planet, moons, arrival_s):
+    # Permute the moons lazily, keeping only the ROUTE_TOP_K best in a heap
+    routecount = math.factorial(len(moons))
+    if executor is not None:
+        print(f"{planet}: scoring {routecount} routes on {worker_count} workers")
+    keep = None if ROUTE_DUMP_ALL else ROUTE_TOP_K
+    heap = []  # (-total, -routenum, route): the worst kept route (latest on ties) on top
+    routes = ([planet] + list(perm) for perm in itertools.permutations(moons))
+    started = last_report = time.perf_counter()
+    for routenum, (route, total_time) in enumerate(scored_routes(routes, arrival_s), start=1):
+        if total_time is not None:
+            if keep is None or len(heap) < keep:
+                heapq.heappush(heap, (-total_time, -routenum, route))
+            elif total_time < -heap[0][0]:
+                heapq.heapreplace(heap, (-total_time, -routenum, route))
+        now = time.perf_counter()
+        if route_progress is not None and now - last_report >= ROUTE_PROGRESS_S:
+            route_progress(planet, routenum, routecount, now - started)
+            last_report = now
+
+    if not heap:
+        print("   No valid permutations found.")
+        return None
+
+    # Sorted by total time, enumeration order on ties
+    candidates = [(route, -neg_total) for neg_total, _, route in sorted(heap, key=lambda x: (-x[0], -x[1]))]
+    label = "All" if len(candidates) == routecount else f"Best {len(candidates)} of {routecount}"
+    print(f"{label} candidate routes for this system (planet-first) (sorted by total time):")
+    for route, tval in candidates:
         days = tval / (3600*24)
         print(f"   Route {route} -> internal travel time: {days:.2f} days")
+    return candidates[0]
 
-    if not all_candidate_routes:
-        print("   No valid permutations found.")
-        return system_bodies, arrival_time, 0.0
+# ------------------------------------------------------------------------------
+# 9) PARALLEL WORKERS
+# ------------------------------------------------------------------------------
+executor = None  # ProcessPoolExecutor when run with --workers > 1
+worker_count = 1
+
+# Module constants a worker must share with the parent process
+WORKER_SETTINGS = [
+    'ACCELERATION', 'CONVERGENCE_THRESHOLD', 'TRAVEL_SOLVER', 'TRAVEL_MAX_ITERATIONS', 'TRAVEL_MODEL', 'MAX_WAIT_DAYS', 'WAIT_INTERVAL_DAYS',
+    'EPHEMERIS_BACKEND',
+    'BATCHED_DEPARTURE_SCAN', 'DEPARTURE_SEARCH', 'DEPARTURE_RESOLUTION_S',
+    'DEPARTURE_COARSE_POINTS', 'POSITION_CACHE', 'POSITION_TOLERANCE_KM', 'PLANET_CENTRIC',
+    'LEG_CACHE_PATH', 'LEG_CACHE_MAX_ENTRIES', 'LEG_SURFACES', 'SURFACE_SPAN_DAYS', 'SURFACE_TOLERANCE_S',
+    'system_order',
+]
+
+def export_shared_ephemeris(start_s, end_s=None):
+    """
+    Write the segments of every body for [start_s, end_s] (default: the tour
+    horizon plus the longest wait) where workers can map them; the path, or
+    None when they have to load the kernels themselves.
+    """
+    if not SHARED_EPHEMERIS or service is not None:
+        return None
+    if end_s is None:
+        end_s = start_s + (TOUR_HORIZON_DAYS + MAX_WAIT_DAYS) * 86400.0
+    kernel_paths = kernel_paths_in_use()
+    path = find_shared(ephemerides_folder, kernel_paths, bodies, start_s, end_s)
+    if path is not None:
+        return path
+    path = shared_path(ephemerides_folder, kernel_paths, bodies, start_s, end_s)
+    raw_bodies = {nm: load_body(nm) for nm in bodies}
+    unsupported = write_shared_ephemeris(path, raw_bodies, start_s, end_s, kernel_paths, horizons_store)
+    if unsupported:
+        print(f"Workers load the kernels themselves: {len(unsupported)} segment(s) are not"
+              f" SPK type 2/3 records, e.g. {unsupported[0]}")
+        return None
+    print(f"Shared ephemeris for the workers: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    prune_shared(ephemerides_folder)
+    return path
+
+def attach_shared_ephemeris(path):
+    """Bodies from the segments export_shared_ephemeris wrote, instead of the kernels."""
+    global shared_ephemeris, horizons_store, position_cache
+    shared_ephemeris = SharedEphemeris(path)
+    horizons_store = HorizonsStore(os.path.join(ephemerides_folder, 'horizons'))
+    position_cache = PositionCache(tolerance_km=POSITION_TOLERANCE_KM)
+
+    bodies.clear()
+    chain_segments.clear()
+    wrap = chain_body if PLANET_CENTRIC else cached
+    for nm in shared_ephemeris.names:
+        bodies[nm] = wrap(nm, shared_ephemeris.body(nm) or horizons_store.body(nm))
+    open_leg_cache()
+    open_leg_surfaces()
+
+def init_worker(settings, shared=None):
+    # Runs once per worker process: same constants as the parent; the
+    # segments are mapped from the parent's export, else the kernels loaded
+    globals().update(settings)
+    if shared and os.path.exists(shared + '.json'):  # another run may have pruned it since
+        attach_shared_ephemeris(shared)
+    else:
+        load_ephemerides(verbose=False)
+
+def pool_needed():
+    # Only the exact route solvers hand work to the pool; local search runs here
+    return any(names[1:] and route_solver(names[1:]) != 'local-search' for _, names in system_order)
+
+def start_workers(workers, start_s=None):
+    global executor, worker_count
+    if not pool_needed():
+        print(f"Not starting {workers} workers: every system goes to the local-search solver, which runs here")
+        return
+    worker_count = workers
+    settings = {name: globals()[name] for name in WORKER_SETTINGS}
+    shared = export_shared_ephemeris(start_s) if start_s is not None else None
+    if shared:
+        attach_shared_ephemeris(shared)  # price legs from the same records as the workers
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                   initargs=(settings, shared))
+    open_leg_surfaces()  # tables built on the pool from now on
+
+def stop_workers():
+    global executor
+    if executor is not None:
+        executor.shutdown()
+        executor = None
+        open_leg_surfaces()
 
-    best_route, best_time = all_candidate_routes[0]
-    print(f"   => Best route is {best_route}, total internal time = {best_time/(3600*24):.2f} days\n")
+def chunksize(jobs):
+    return max(1, jobs // (worker_count * 4))
 
-    # Now "fly" it to get final arrival_time
-    current_t = arrival_time
-    for i in range(len(best_route) - 1):
-        fromB = best_route[i]
-        toB = best_route[i+1]
-        dep, t_travel, _ = optimal_departure(bodies[fromB], bodies[toB], current_t)
-        current_t = record_leg("System: " + system_bodies[0], fromB, toB, dep, t_travel)
+def worker_leg_cost(job):
+    fromB, toB, leg_start_s = job
+    _, _, leg_t = optimal_departure(bodies[fromB], bodies[toB], leg_start_s)
+    return leg_t
 
-    return best_route, current_t, best_time
+def worker_route_totals(job):
+    routes, arrival_s, tables = job
+    if tables is not None:
+        leg_surfaces.adopt(routes[0][0], tables, bodies)
+    return [route_total_unchained(route, arrival_s) for route in routes]
+
+def worker_pair_surface(job):
+    fromB, toB, start_s = job
+    solves = leg_surfaces.solves
+    table, error = leg_surfaces.build(bodies[fromB], bodies[toB], start_s)
+    return table, error, leg_surfaces.solves - solves
+
+def pool_surface_builds(jobs):
+    return list(executor.map(worker_pair_surface, jobs))
 
 # ------------------------------------------------------------------------------
-# 9) MAIN TOUR SEQUENCE
+# 10) MAIN TOUR SEQUENCE
 # ------------------------------------------------------------------------------
-ts = load.timescale()
-start_time = ts.utc(2025, 1, 1)
-current_time = start_time
-
-overall_details = []
-
-# (A) INITIAL JOURNEY: Earth -> Mercury
-if 'Earth' in bodies and 'Mercury' in bodies:
-    dep_time, t_travel, total_sec = optimal_departure(bodies['Earth'], bodies['Mercury'], current_time)
-    next_time = record_leg("Initial Earth->Mercury", 'Earth', 'Mercury', dep_time, t_travel)
-    overall_details.append({
-        'System': "Initial Transit: Earth -> Mercury",
-        'Route': 'Earth -> Mercury',
-        'System Start': current_time.utc_strftime('%Y-%m-%d'),
-        'System Finish': next_time.utc_strftime('%Y-%m-%d'),
-        'Internal Time (days)': total_sec / (3600 * 24)
-    })
-    current_time = next_time
-else:
-    print("Cannot do initial Earth->Mercury transit; missing bodies.")
-
-# (B) Go system by system
-overall_route = []
-for idx, (system_name, system_bodies) in enumerate(system_order):
-    print(f"\n=== Optimizing {system_name} ===")
-    missing = [b for b in system_bodies if b not in bodies]
-    if missing:
-        print(f"Warning: skipping {system_name}, missing: {missing}")
-        continue
-
-    best_route, final_time, internal_time = optimize_system_route(system_bodies, current_time)
-    overall_route.append((system_name, best_route))
-    overall_details.append({
-        'System': system_name,
-        'Route': best_route,
-        'System Start': current_time.utc_strftime('%Y-%m-%d'),
-        'System Finish': final_time.utc_strftime('%Y-%m-%d'),
-        'Internal Time (days)': internal_time / (3600 * 24)
-    })
-    current_time = final_time
-
-    # Transit to next system if not last
-    if idx < len(system_order) - 1:
-        next_sys, next_bodies = system_order[idx + 1]
-        next_planet = next_bodies[0]  # always the planet, by design
-        if best_route and best_route[-1] in bodies and next_planet in bodies:
-            dep_time, t_travel, tot = optimal_departure(bodies[best_route[-1]], bodies[next_planet], current_time)
-            next_time = record_leg(f"Transit: {system_name}->{next_sys}",
-                                   best_route[-1], next_planet,
-                                   dep_time, t_travel)
-            overall_details.append({
-                'System': f"Transit: {system_name} -> {next_sys}",
-                'Route': f"{best_route[-1]} -> {next_planet}",
-                'System Start': current_time.utc_strftime('%Y-%m-%d'),
-                'System Finish': next_time.utc_strftime('%Y-%m-%d'),
-                'Internal Time (days)': tot / (3600 * 24)
-            })
-            current_time = next_time
+def sequential_tour(start_s):
+    current_s = start_s
+
+    overall_details = []
+
+    # (A) INITIAL JOURNEY: Earth -> Mercury
+    if 'Earth' in bodies and 'Mercury' in bodies:
+        dep_s, t_travel, total_sec = optimal_departure(bodies['Earth'], bodies['Mercury'], current_s)
+        next_s = record_leg("Initial Earth->Mercury", 'Earth', 'Mercury', dep_s, t_travel, current_s)
+        overall_details.append({
+            'System': "Initial Transit: Earth -> Mercury",
+            'Route': 'Earth -> Mercury',
+            'System Start': current_s,
+            'System Finish': next_s,
+            'Internal Time (days)': total_sec / (3600 * 24)
+        })
+        current_s = next_s
+    else:
+        print("Cannot do initial Earth->Mercury transit; missing bodies.")
+
+    # (B) Go system by system
+    overall_route = []
+    for idx, (system_name, system_bodies) in enumerate(system_order):
+        print(f"\n=== Optimizing {system_name} ===")
+        position_cache.set_window(tdb_time(current_s))  # the tour never looks back
+        missing = [b for b in system_bodies if b not in bodies]
+        if missing:
+            print(f"Warning: skipping {system_name}, missing: {missing}")
+            continue
+
+        best_route, final_s, internal_time = optimize_system_route(system_bodies, current_s)
+        overall_route.append((system_name, best_route))
+        overall_details.append({
+            'System': system_name,
+            'Route': best_route,
+            'System Start': current_s,
+            'System Finish': final_s,
+            'Internal Time (days)': internal_time / (3600 * 24)
+        })
+        current_s = final_s
+
+        # Transit to next system if not last
+        if idx < len(system_order) - 1:
+            next_sys, next_bodies = system_order[idx + 1]
+            next_planet = next_bodies[0]  # always the planet, by design
+            if best_route and best_route[-1] in bodies and next_planet in bodies:
+                dep_s, t_travel, tot = optimal_departure(bodies[best_route[-1]], bodies[next_planet], current_s)
+                next_s = record_leg(f"Transit: {system_name}->{next_sys}",
+                                       best_route[-1], next_planet,
+                                       dep_s, t_travel, current_s)
+                overall_details.append({
+                    'System': f"Transit: {system_name} -> {next_sys}",
+                    'Route': f"{best_route[-1]} -> {next_planet}",
+                    'System Start': current_s,
+                    'System Finish': next_s,
+                    'Internal Time (days)': tot / (3600 * 24)
+                })
+                current_s = next_s
+            else:
+                print(f"Warning: cannot transit from {best_route[-1]} to {next_planet} (missing).")
+
+    # (C) FINAL JOURNEY: Pluto->Earth
+    print("\n=== Final Transit from Pluto System back to Earth ===")
+    if 'Earth' in bodies and overall_route:
+        # The last system is Pluto
+        final_sys_name, final_sys_route = overall_route[-1]
+        if final_sys_route:
+            last_body = final_sys_route[-1]
+            if last_body in bodies:
+                dep_s, t_travel, total_s = optimal_departure(bodies[last_body], bodies['Earth'], current_s)
+                next_s = record_leg("Final Pluto->Earth", last_body, 'Earth', dep_s, t_travel, current_s)
+                overall_details.append({
+                    'System': "Final Transit: Pluto -> Earth",
+                    'Route': f"{last_body} -> Earth",
+                    'System Start': current_s,
+                    'System Finish': next_s,
+                    'Internal Time (days)': total_s / (3600 * 24)
+                })
+                current_s = next_s
+            else:
+                print("Cannot do final Pluto->Earth; last body missing.")
         else:
-            print(f"Warning: cannot transit from {best_route[-1]} to {next_planet} (missing).")
-
-# (C) FINAL JOURNEY: Pluto->Earth
-print("\n=== Final Transit from Pluto System back to Earth ===")
-if 'Earth' in bodies and overall_route:
-    # The last system is Pluto
-    final_sys_name, final_sys_route = overall_route[-1]
-    if final_sys_route:
-        last_body = final_sys_route[-1]
-        if last_body in bodies:
-            dep_time, t_travel, total_s = optimal_departure(bodies[last_body], bodies['Earth'], current_time)
-            next_time = record_leg("Final Pluto->Earth", last_body, 'Earth', dep_time, t_travel)
+            print("No final route in Pluto system.")
+    else:
+        print("Cannot do final transit; Earth or route missing.")
+
+    return overall_details
+
+def global_tour(start_s, beam_width=3, entries='all', time_budget_s=None):
+    """
+    - Choose the system order and each system's entry body with beam_search_tour
+    - Systems are scored with Held-Karp from the chosen entry body
+    - Fly the best plan with the same optimal_departure/record_leg legs
+    """
+    systems = []
+    for system_name, system_bodies in system_order:
+        missing = [b for b in system_bodies if b not in bodies]
+        if missing:
+            print(f"Warning: skipping {system_name}, missing: {missing}")
+            continue
+        systems.append((system_name, system_bodies))
+    planets_of = {name: names[0] for name, names in systems}
+
+    def at(elapsed_s):
+        return start_s + elapsed_s
+
+    def leg_cost(fromB, toB, elapsed_s):
+        _, _, leg_t = optimal_departure(bodies[fromB], bodies[toB], at(elapsed_s))
+        return leg_t
+
+    def system_route(system_bodies, entry, elapsed_s):
+        others = [b for b in system_bodies if b != entry]
+        if not others:
+            return [entry], 0.0
+        solver = 'local-search' if len(others) > ROUTE_EXACT_MAX_MOONS else 'held-karp'
+        with timed_system(system_bodies[0], entry=entry, moons=len(others), solver=solver):
+            if solver == 'local-search':
+                return local_search_system_route(entry, others, at(elapsed_s), center=system_bodies[0])
+            return held_karp_system_route(entry, others, at(elapsed_s))
+
+    def report(total_s, plan):
+        order = ' -> '.join(name for name, _ in plan)
+        print(f"   Best tour so far: {total_s/(3600*24):.2f} days: {order}")
+
+    print("\n=== Searching system order ===")
+    total_s, plan, stats = beam_search_tour(
+        'Earth', systems, leg_cost, system_route, beam_width=beam_width,
+        entries=entries, time_budget_s=time_budget_s, report=report)
+    print(f"Global search: {stats['states']} states ({stats['pruned']} pruned),"
+          f" {stats['system_solves']} system solves"
+          + (" (time budget reached)" if stats['out_of_time'] else ""))
+    if plan is None:
+        print("Global search found no complete tour")
+        return []
+
+    overall_details = []
+    current_s = start_s
+    current_body, previous = 'Earth', None
+    for system_name, route in plan + [(None, ['Earth'])]:
+        position_cache.set_window(tdb_time(current_s))  # the tour never looks back
+        if route[0] != current_body:
+            if previous is None:
+                label = f"Initial Transit: Earth -> {system_name}"
+            elif system_name is None:
+                label = f"Final Transit: {previous} -> Earth"
+            else:
+                label = f"Transit: {previous} -> {system_name}"
+            dep_s, t_travel, tot = optimal_departure(bodies[current_body], bodies[route[0]], current_s)
+            next_s = record_leg(label.replace(' -> ', '->'), current_body, route[0], dep_s, t_travel,
+                                   current_s)
             overall_details.append({
-                'System': "Final Transit: Pluto -> Earth",
-                'Route': f"{last_body} -> Earth",
-                'System Start': current_time.utc_strftime('%Y-%m-%d'),
-                'System Finish': next_time.utc_strftime('%Y-%m-%d'),
-                'Internal Time (days)': total_s / (3600 * 24)
+                'System': label,
+                'Route': f"{current_body} -> {route[0]}",
+                'System Start': current_s,
+                'System Finish': next_s,
+                'Internal Time (days)': tot / (3600 * 24)
             })
-            current_time = next_time
-        else:
-            print("Cannot do final Pluto->Earth; last body missing.")
+            current_s = next_s
+        if system_name is None:
+            break
+        final_s = fly_route("System: " + planets_of[system_name], route, current_s)
+        overall_details.append({
+            'System': system_name,
+            'Route': route,
+            'System Start': current_s,
+            'System Finish': final_s,
+            'Internal Time (days)': (final_s - current_s) / (24 * 3600)
+        })
+        current_s, current_body, previous = final_s, route[-1], system_name
+
+    return overall_details
+
+# ------------------------------------------------------------------------------
+# 11) TOUR PLANNER
+#
+# The engine for notebooks, tests, benchmarks and other programs:
+#     planner = TourPlanner(verbose=False)
+#     plan = planner.plan_tour('2025-01-01')
+#     plan['final_arrival_utc'], plan['legs'][0]
+#     planner.plan_system(['Jupiter', 'Io', 'Europa'], '2025-03-01')['route']
+# Importing this module loads nothing (not even Skyfield or pandas); the
+# first plan loads the kernels or attaches to tourservice.py. Kernels,
+# bodies, caches and the worker pool stay in the module globals, where the
+# workers and the service expect them, so later plans reuse them.
+# ------------------------------------------------------------------------------
+class CoverageError(Exception):
+    pass
+
+def start_seconds(start):
+    """TDB seconds of a start given as 'YYYY-MM-DD' (0h UTC), a Skyfield Time or TDB seconds."""
+    if isinstance(start, str):
+        year, month, day = (int(x) for x in start.split('-'))
+        start = timescale().utc(year, month, day)
+    if hasattr(start, 'whole'):
+        return tdb_seconds(start)
+    return float(start)
+
+class TourPlanner:
+    """
+    - systems: [(label, [planet, moon, ...]), ...] to tour instead of system_order
+    - catalogue, include: build the systems from a PlanetsAndMoons workbook instead
+    - use_service: plan through a running tourservice.py with the same settings
+    - workers: processes for route scoring, started for the first plan
+    - verbose: False keeps the tour's progress output off stdout
+    """
+    def __init__(self, systems=None, catalogue=CATALOGUE, include=CATALOGUE_INCLUDE,
+                 use_service=USE_SERVICE, workers=1, verbose=True):
+        self.systems = systems
+        self.catalogue = catalogue
+        self.include = include
+        self.use_service = use_service
+        self.workers = workers
+        self.verbose = verbose
+        self.loaded = False
+        self.workers_start_s = None  # the start the pool's shared ephemeris was written for
+
+    def output(self):
+        return nullcontext() if self.verbose else redirect_stdout(io.StringIO())
+
+    def load(self):
+        """Load the ephemerides, or attach to the service, unless done already."""
+        global system_order
+        if self.loaded:
+            return self
+        with self.output():
+            if self.catalogue:
+                system_order = catalogue_systems(load_catalogue(self.catalogue), self.include)
+            elif self.systems is not None:
+                system_order = list(self.systems)
+            if not (self.use_service and attach_service()):
+                load_ephemerides(self.verbose)
+            if self.catalogue:
+                # Tour what the ephemerides have rather than skipping whole systems
+                system_order = [(name, [b for b in names if b in bodies])
+                                for name, names in system_order if names[0] in bodies]
+                print(f"Catalogue: {len(system_order)} systems, "
+                      f"{sum(len(names) for _, names in system_order)} bodies with ephemerides")
+        self.loaded = True
+        return self
+
+    def prepare(self, start_s, warm_start_path=None):
+        # Coverage check, a fresh itinerary and a worker pool for a plan from start_s
+        global warm_start
+        problems = check_coverage(tdb_time(start_s), tdb_time(start_s + TOUR_HORIZON_DAYS * 86400.0))
+        if problems:
+            raise CoverageError("Tour window is outside ephemeris coverage:\n  " + "\n  ".join(problems))
+        reset_itinerary()
+        if self.workers > 1 and self.workers_start_s != start_s:
+            stop_workers()  # its shared ephemeris covers another span
+            start_workers(self.workers, start_s)
+            self.workers_start_s = start_s
+        warm_start = None
+        if warm_start_path:  # after the pool: the settings say which ephemeris prices the legs
+            warm_start = WarmStart(warm_start_path, leg_settings(), WARM_LEG_TOLERANCE_S,
+                                   WARM_ROUTE_TOLERANCE_HOURS * 3600)
+
+    def plan_tour(self, start='2025-01-01', global_order=False, beam_width=3, entries='all',
+                  time_budget_s=None, warm_start_path=None):
+        """
+        The tour from start, sequential or with the global search (see global_tour).
+        Returns {'start_s', 'final_s', 'final_arrival_utc', 'total_days',
+        'systems': summary rows, 'legs': itinerary rows}, UTC as printed.
+        """
+        self.load()
+        start_s = start_seconds(start)
+        with self.output():
+            self.prepare(start_s, warm_start_path)
+            if global_order:
+                overall_details = global_tour(start_s, beam_width, entries, time_budget_s)
+            else:
+                overall_details = sequential_tour(start_s)
+        final_s = itinerary[-1]['Arrival UTC'] if itinerary else start_s
+        legs = itinerary_rows()
+        return {
+            'start_s': start_s,
+            'final_s': final_s,
+            'final_arrival_utc': legs[-1]['Arrival UTC'] if legs else None,
+            'total_days': (final_s - start_s) / 86400.0,
+            'systems': summary_rows(overall_details),
+            'legs': legs,
+        }
+
+    def plan_system(self, names, start):
+        """
+        The best route through one system entered at names[0] at start.
+        Returns {'route', 'internal_days', 'start_s', 'final_s',
+        'final_arrival_utc', 'legs': itinerary rows}.
+        """
+        self.load()
+        start_s = start_seconds(start)
+        with self.output():
+            self.prepare(start_s)
+            route, final_s, internal_s = optimize_system_route(list(names), start_s)
+        legs = itinerary_rows()
+        return {
+            'route': list(route),
+            'internal_days': internal_s / 86400.0,
+            'start_s': start_s,
+            'final_s': final_s,
+            'final_arrival_utc': legs[-1]['Arrival UTC'] if legs else None,
+            'legs': legs,
+        }
+
+    def close(self):
+        """Stop the workers and close the leg cache and the service connection."""
+        global leg_cache, service
+        stop_workers()
+        self.workers_start_s = None
+        if leg_cache is not None:
+            leg_cache.close()
+            leg_cache = None
+        if service is not None:
+            service.close()
+            service = None
+        self.loaded = False
+
+# ------------------------------------------------------------------------------
+# 12) PRINT SUMMARIES
+# ------------------------------------------------------------------------------
+def print_summaries(systems, legs):
+    import pandas as pd  # only for printing the tables
+    print("\n=== SYSTEM-BY-SYSTEM SUMMARY ===")
+    print(pd.DataFrame(systems))
+
+    print("\n=== FULL ITINERARY (LEG-BY-LEG) ===")
+    print(pd.DataFrame(legs).to_string(index=False))
+
+    if legs:
+        final_arrival = legs[-1]['Arrival UTC']
+        print(f"\nFinal arrival time: {final_arrival}")
     else:
-        print("No final route in Pluto system.")
-else:
-    print("Cannot do final transit; Earth or route missing.")
+        print("\nNo travel legs recorded!")
 
 # ------------------------------------------------------------------------------
-# 10) PRINT SUMMARIES
+# 13) ENTRY POINT
 # ------------------------------------------------------------------------------
-df_systems = pd.DataFrame(overall_details)
-print("\n=== SYSTEM-BY-SYSTEM SUMMARY ===")
-print(df_systems)
-
-df_legs = pd.DataFrame(itinerary)
-print("\n=== FULL ITINERARY (LEG-BY-LEG) ===")
-print(df_legs.to_string(index=False))
-
-if itinerary:
-    final_arrival = itinerary[-1]['Arrival UTC']
-    print(f"\nFinal arrival time: {final_arrival}")
-else:
-    print("\nNo travel legs recorded!")
+def main():
+    parser = argparse.ArgumentParser(description="Plan a tour of the planets and their moons.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="worker processes for route scoring (default: 1, no pool)")
+    parser.add_argument('--global-order', action='store_true',
+                        help="search the system order and entry bodies instead of system_order")
+    parser.add_argument('--beam-width', type=int, default=3,
+                        help="partial tours kept per level of the global search")
+    parser.add_argument('--entries', choices=['all', 'planet'], default='all',
+                        help="enter each system at any body, or only at its planet")
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help="seconds for the global search before it completes greedily")
+    parser.add_argument('--report', metavar='PATH',
+                        help="write an instrumentation report (JSON) for this run")
+    parser.add_argument('--profile-system', metavar='PLANET',
+                        help="profile the first solve of this system (e.g. Jupiter)")
+    parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], default='cprofile')
+    parser.add_argument('--start', default='2025-01-01', help="tour start date, YYYY-MM-DD (UTC)")
+    parser.add_argument('--save-run', metavar='PATH',
+                        help="save this run's legs and routes for a later --warm-start")
+    parser.add_argument('--warm-start', metavar='PATH',
+                        help="reuse legs and routes from a --save-run file where still valid")
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help="ephemeris backend (default: the EPHEMERIS_BACKEND constant)")
+    parser.add_argument('--no-service', action='store_true',
+                        help="load the ephemerides here even if tourservice.py is running")
+    parser.add_argument('--dump-routes', action='store_true',
+                        help="with ROUTE_SOLVER = 'permutations', print every candidate route")
+    parser.add_argument('--catalogue', metavar='XLSX', default=CATALOGUE,
+                        help="build the systems from this PlanetsAndMoons workbook instead of system_order")
+    parser.add_argument('--include', choices=['tour', 'all'], default=CATALOGUE_INCLUDE,
+                        help="with --catalogue: the bodies marked 'Include in Tour', or all of them")
+    parser.add_argument('--route-budget', type=float, default=None,
+                        help="seconds per system for the local-search route solver")
+    args = parser.parse_args()
+
+    global instrumentation, ROUTE_DUMP_ALL, EPHEMERIS_BACKEND, ROUTE_TIME_BUDGET_S
+    ROUTE_DUMP_ALL = ROUTE_DUMP_ALL or args.dump_routes
+    EPHEMERIS_BACKEND = args.backend or EPHEMERIS_BACKEND
+    ROUTE_TIME_BUDGET_S = args.route_budget or ROUTE_TIME_BUDGET_S
+    if args.report or args.profile_system:
+        instrumentation = Instrumentation(args.profile_system, args.profiler)
+
+    planner = TourPlanner(catalogue=args.catalogue, include=args.include,
+                          use_service=USE_SERVICE and not args.no_service, workers=args.workers)
+    try:
+        plan = planner.plan_tour(args.start, args.global_order, args.beam_width, args.entries,
+                                 args.time_budget, args.warm_start)
+    except CoverageError as e:
+        sys.exit(str(e))
+    print_summaries(plan['systems'], plan['legs'])
+    if args.save_run:
+        save_run(args.save_run, leg_settings(), plan['start_s'], flown_legs, flown_systems,
+                 plan['systems'], plan['legs'])
+
+    print(f"\nDistance evaluations: {distance_evaluations}")
+    if warm_start is not None:
+        print(f"Warm start: {warm_start.stats()}")
+    if service is not None:
+        print(f"Tour service: {service.stats()}")
+    elif POSITION_CACHE:
+        print(f"Position cache: {position_cache.stats()}")
+    if leg_cache is not None:
+        print(f"Leg cache: {leg_cache.stats()}")
+    if leg_surfaces is not None:
+        print(f"Leg surfaces: {leg_surfaces.stats()}")
+    if instrumentation is not None:
+        if instrumentation.profile:
+            print(f"\n=== Profile of {args.profile_system} ===\n{instrumentation.profile}")
+        if args.report:
+            instrumentation.write(
+                args.report,
+                workers=worker_count,  # counts cover this process only
+                distance_evaluations=distance_evaluations,
+                caches={
+                    'position': position_cache.stats() if POSITION_CACHE else None,
+                    'legs': leg_cache.stats() if leg_cache is not None else None,
+                    'surfaces': leg_surfaces.stats() if leg_surfaces is not None else None,
+                },
+                overall_details=plan['systems'],
+                itinerary=plan['legs'])
+            print(f"Instrumentation report written to {args.report}")
+    planner.close()
+
+if __name__ == '__main__':
+    main()
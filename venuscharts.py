@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from skyfield.api import load, wgs84
+from skyfield.magnitudelib import planetary_magnitude
+from legcache import kernel_fingerprint
+
+# ------------------------------------------------------------------------------
+# Batch planet-at-sunset charts for many observers, years and planets
+#
+# The same chart as `venus evening chart.py`, but for every combination at
+# once:
+#   1) Sunsets for all observers and days of a year in one vectorized pass:
+#      the Sun's apparent RA/Dec and GAST give each observer's local hour
+#      angle, which is driven to the sunset hour angle for the standard
+#      -0.8333 degree horizon, raised by the Sun's parallax, in a few Newton
+#      steps (no find_discrete per observer). For 2025 this matches
+#      almanac.sunrise_sunset within 0.01 s up to 60 degrees latitude and
+#      0.2 s at the polar circles, where it also finds the sunsets of nights
+#      the Sun dips under the horizon for less than the almanac's 0.04 day
+#      step. Results are cached per (observer, year) as .npy files, named
+#      after the kernel and the sunset settings (sunset_key).
+#   2) One observe().apparent().altaz() and planetary_magnitude() per planet
+#      over every observer and sunset together (Skyfield evaluates vector
+#      wgs84 positions element by element).
+#   3) The figures are drawn in a process pool on the non-interactive Agg
+#      backend.
+#
+#     python venuscharts.py --latitudes=-40,-20,0,20,40,60 --years 2024,2025 \
+#         --planets venus,mercury --workers 8 --output charts
+# ------------------------------------------------------------------------------
+
+EPHEMERIS = 'de421.bsp'
+CACHE_DIR = 'chartcache'
+SUNSET_ALTITUDE_DEG = -0.8333  # upper limb with standard refraction, as almanac.sunrise_sunset
+SUNSET_ITERATIONS = 4  # the fourth step moves sunsets by < 0.001 s
+EARTH_RADIUS_KM = 6378.137
+SUNSET_METHOD = 2  # bump when sunset_times computes something else (2: horizon raised by the parallax)
+PLANETS = {
+    'mercury': 'mercury', 'venus': 'venus', 'mars': 'mars',
+    'jupiter': 'jupiter barycenter', 'saturn': 'saturn barycenter',
+}
+MONTH_NAMES = '0 Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec'.split()
+
+# ------------------------------------------------------------------------------
+# 1) SUNSETS
+# ------------------------------------------------------------------------------
+def sunset_times(eph, ts, latitudes, longitudes, year):
+    """
+    (observers, days of year) TT Julian dates of each day's sunset,
+    NaN where the Sun does not set (polar day or night).
+    """
+    earth, sun = eph['earth'], eph['sun']
+    lat = np.radians(np.asarray(latitudes, dtype=float))[:, None]
+    lon = np.asarray(longitudes, dtype=float)[:, None]
+    first = ts.utc(year, 1, 1)
+    days = int(round(ts.utc(year + 1, 1, 1) - first))
+    # Start at 18:00 local mean time, then Newton on the hour angle
+    jd = first.tt + np.arange(days)[None, :] + 0.75 - lon / 360.0
+    for _ in range(SUNSET_ITERATIONS):
+        t = ts.tt_jd(jd.ravel())
+        ra, dec, distance = earth.at(t).observe(sun).apparent().radec(epoch='date')
+        dec = dec.radians.reshape(jd.shape)
+        # The geocentric Sun stands higher than the observer's by its horizontal parallax
+        parallax = np.arcsin(EARTH_RADIUS_KM / distance.km).reshape(jd.shape)
+        sin_h0 = np.sin(np.radians(SUNSET_ALTITUDE_DEG) + parallax)
+        hour_angle = (t.gast - ra.hours).reshape(jd.shape) * 15.0 + lon
+        cos_h0 = (sin_h0 - np.sin(lat) * np.sin(dec)) / (np.cos(lat) * np.cos(dec))
+        sets = np.abs(cos_h0) <= 1.0
+        h0 = np.degrees(np.arccos(np.clip(cos_h0, -1.0, 1.0)))
+        # The Sun's hour angle grows by ~360 degrees per day
+        jd = jd + ((h0 - hour_angle + 180.0) % 360.0 - 180.0) / 360.0
+    return np.where(sets, jd, np.nan)
+
+def sunset_key(eph):
+    # The kernel file (name, size, mtime) and everything else sunset_times' results depend on
+    settings = (SUNSET_METHOD, SUNSET_ALTITUDE_DEG, SUNSET_ITERATIONS, EARTH_RADIUS_KM)
+    return hashlib.sha1(f"{kernel_fingerprint([eph.path])}:{settings!r}".encode()).hexdigest()[:12]
+
+def observer_file(cache_dir, key, lat, lon, year):
+    return os.path.join(cache_dir, f"sunsets_{key}_{lat:+08.3f}_{lon:+09.3f}_{year}.npy")
+
+def cached_sunsets(eph, ts, observers, year, cache_dir=CACHE_DIR):
+    """{(lat, lon): sunsets} for one year; only observers not on disk are computed, all together."""
+    os.makedirs(cache_dir, exist_ok=True)
+    key = sunset_key(eph)
+    result = {}
+    missing = []
+    for lat, lon in observers:
+        path = observer_file(cache_dir, key, lat, lon, year)
+        if os.path.exists(path):
+            result[lat, lon] = np.load(path)
+        else:
+            missing.append((lat, lon))
+    if missing:
+        lats, lons = zip(*missing)
+        for (lat, lon), jd in zip(missing, sunset_times(eph, ts, lats, lons, year)):
+            np.save(observer_file(cache_dir, key, lat, lon, year), jd)
+            result[lat, lon] = jd
+    return result
+
+# ------------------------------------------------------------------------------
+# 2) ONE OBSERVATION PASS PER PLANET
+# ------------------------------------------------------------------------------
+def chart_jobs(eph, ts, observers, years, planets, output, cache_dir=CACHE_DIR):
+    """One job (the data of one figure) per observer, year and planet."""
+    earth = eph['earth']
+    charts = []  # (lat, lon, year, sunset TT JDs)
+    for year in years:
+        sunsets = cached_sunsets(eph, ts, observers, year, cache_dir)
+        for lat, lon in observers:
+            jd = sunsets[lat, lon]
+            charts.append((lat, lon, year, jd[np.isfinite(jd)]))
+    counts = [len(jd) for _, _, _, jd in charts]
+    if not sum(counts):
+        return []
+    lat = np.repeat([c[0] for c in charts], counts)
+    lon = np.repeat([c[1] for c in charts], counts)
+    t = ts.tt_jd(np.concatenate([c[3] for c in charts]))
+    _, month, day, _, _, _ = t.utc
+    observer_at = (earth + wgs84.latlon(lat, lon)).at(t)
+
+    jobs = []
+    bounds = np.cumsum([0] + counts)
+    for planet in planets:
+        apparent = observer_at.observe(eph[PLANETS[planet]]).apparent()
+        alt, az, _ = apparent.altaz()
+        magnitude = planetary_magnitude(apparent)
+        for (c_lat, c_lon, year, _), a, b in zip(charts, bounds[:-1], bounds[1:]):
+            if a == b:
+                continue
+            place = f"{abs(c_lat):g}°{'N' if c_lat >= 0 else 'S'}"
+            if c_lon:
+                place += f" {abs(c_lon):g}°{'E' if c_lon > 0 else 'W'}"
+            jobs.append({
+                'path': os.path.join(output, f"{planet}_{c_lat:+.1f}_{c_lon:+.1f}_{year}.png"),
+                'title': f"{planet.capitalize()} at sunset for {place}, {year}",
+                'x': az.degrees[a:b], 'y': alt.degrees[a:b], 'm': magnitude[a:b],
+                'month': month[a:b].astype(int), 'day': day[a:b].astype(int),
+            })
+    return jobs
+
+# ------------------------------------------------------------------------------
+# 3) RENDERING
+# ------------------------------------------------------------------------------
+def render_chart(job):
+    # Runs in a pool worker; Agg needs no display
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LinearSegmentedColormap
+
+    x, y, m, month, day = job['x'], job['y'], job['m'], job['month'], job['day']
+
+    # Brighter (smaller magnitude) means a larger marker
+    span = np.nanmax(m) - np.nanmin(m)
+    size = 40 - 30 * (m - np.nanmin(m)) / span if span > 0 else np.full(len(m), 25.0)
+
+    fig, ax = plt.subplots(figsize=[9, 3])
+    ax.plot(x, y, c='#fff6', zorder=1)
+
+    # A circle on the 1st of the month and every fifth day after it
+    fives = (day % 5 == 1) & (day < 30)
+    ax.scatter(x[fives], y[fives], size[fives], 'white',
+               edgecolor='black', linewidth=0.25, zorder=2)
+
+    # Day and month labels at a right angle to the direction of travel
+    offset_x, offset_y = 10, 8
+    for i in np.flatnonzero(fives):
+        if i == 0:
+            continue
+        dx, dy = x[i] - x[i-1], y[i] - y[i-1]
+        length = np.sqrt(dx*dx + dy*dy)
+        if length == 0:
+            continue
+        dx, dy = dx / length, dy / length
+        xytext = - offset_x*dy, offset_y*dx
+        if day[i] in (1, 11, 21):
+            ax.annotate(day[i], (x[i], y[i]), c='white', ha='center', va='center',
+                        textcoords='offset points', xytext=xytext, size=8)
+        if day[i] == 16:
+            ax.annotate(MONTH_NAMES[month[i]], (x[i], y[i]), c='white', ha='center', va='center',
+                        textcoords='offset points', xytext=2.2 * np.array(xytext))
+
+    for i, name in enumerate('N NE E SE S SW W NW'.split()):
+        ax.annotate(name, (45 * i, 1), c='white', ha='center', size=12, weight='bold')
+
+    left, right = np.floor(np.min(x) / 15) * 15 - 15, np.ceil(np.max(x) / 15) * 15 + 15
+    ax.set(
+        aspect=1.0,
+        title=job['title'],
+        xlabel='Azimuth (°)',
+        ylabel='Altitude (°)',
+        xlim=(left, right),
+        ylim=(0, max(np.max(y), 0.0) + 10.0),
+        xticks=np.arange(left + 15, right, 15),
+    )
+    sky = LinearSegmentedColormap.from_list('sky', ['black', 'blue'])
+    extent = ax.get_xlim() + ax.get_ylim()
+    ax.imshow([[0, 0], [1, 1]], cmap=sky, interpolation='bicubic', extent=extent)
+    fig.savefig(job['path'], bbox_inches='tight')  # keeps the azimuth label inside a 3 inch figure
+    plt.close(fig)
+    return job['path']
+
+def render_all(jobs, workers):
+    if workers <= 1:
+        return [render_chart(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_chart, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+def floats(text):
+    return [float(x) for x in text.split(',')]
+
+def ints(text):
+    return [int(x) for x in text.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="Draw planet-at-sunset charts for many observers and years.")
+    parser.add_argument('--latitudes', type=floats, default=[40.0], help="comma-separated degrees")
+    parser.add_argument('--longitudes', type=floats, default=[0.0], help="comma-separated degrees east")
+    parser.add_argument('--years', type=ints, default=[2024])
+    parser.add_argument('--planets', default='venus', help=f"comma-separated, from {', '.join(PLANETS)}")
+    parser.add_argument('--ephemeris', default=EPHEMERIS)
+    parser.add_argument('--cache', default=CACHE_DIR)
+    parser.add_argument('--output', default='charts')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    planets = args.planets.split(',')
+    unknown = [p for p in planets if p not in PLANETS]
+    if unknown:
+        parser.error(f"unknown planet(s): {', '.join(unknown)}")
+    observers = list(itertools.product(args.latitudes, args.longitudes))
+    os.makedirs(args.output, exist_ok=True)
+    eph = load(args.ephemeris)
+    ts = load.timescale()
+
+    started = time.perf_counter()
+    jobs = chart_jobs(eph, ts, observers, args.years, planets, args.output, args.cache)
+    computed = time.perf_counter()
+    print(f"Computed {len(jobs)} charts ({len(observers)} observers x {len(args.years)} years"
+          f" x {len(planets)} planets) in {computed - started:.1f} s")
+    render_all(jobs, args.workers)
+    print(f"Rendered them to {args.output}/ in {time.perf_counter() - computed:.1f} s")
+
+if __name__ == '__main__':
+    main()
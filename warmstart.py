@@ -0,0 +1,81 @@
+import json
+
+# ------------------------------------------------------------------------------
+# Warm start from a previous tour run
+#
+# trytour --save-run writes the flown legs and system solves with full
+# precision (TDB seconds past J2000, as trytour keeps time). --warm-start
+# loads them back into a WarmStart, which trytour consults in three places:
+#     leg()   - a leg asked for within leg_tolerance_s of when it was asked
+#               last time is reused verbatim (same departure if still ahead)
+#     reuse() - a system entered within route_tolerance_s of last time, with
+#               the same bodies, keeps its previous route without a solve
+#     seed()  - otherwise the previous route (minus dropped bodies, plus new
+#               ones) bounds the Held-Karp search from above
+# Leg reuse is only valid under the same physics settings; if they differ,
+# or the run was saved before times were kept in seconds, only the routes
+# are used.
+# ------------------------------------------------------------------------------
+
+def save_run(path, settings, start_s, flown_legs, flown_systems, overall_details, itinerary):
+    with open(path, 'w') as f:
+        json.dump({
+            'settings': settings,
+            'start_s': float(start_s),
+            'legs': flown_legs,
+            'systems': flown_systems,
+            'overall_details': overall_details,
+            'itinerary': itinerary,
+        }, f, indent=1, default=str)
+
+class WarmStart:
+    def __init__(self, path, settings, leg_tolerance_s=60, route_tolerance_s=3600):
+        self.leg_tolerance_s = leg_tolerance_s
+        self.route_tolerance_s = route_tolerance_s
+        with open(path) as f:
+            run = json.load(f)
+        self.legs = {}  # (from id, to id) -> [(query_s, departure_s, travel_s)]
+        if 'start_s' not in run:
+            print("Warm start: run saved in the old format, reusing routes but not legs")
+        elif run['settings'] == settings:
+            for leg in run['legs']:
+                self.legs.setdefault((leg['from_id'], leg['to_id']), []).append(
+                    (leg['query_s'], leg['departure_s'], leg['travel_s']))
+        else:
+            print("Warm start: settings changed, reusing routes but not legs")
+        self.systems = {s['planet']: s for s in run['systems']}
+        self.legs_reused = 0
+        self.routes_reused = 0
+        self.routes_seeded = 0
+
+    def leg(self, from_id, to_id, now_s):
+        """(departure_s, travel_s, total_s) of a previous leg, or None."""
+        for query_s, departure_s, travel_s in self.legs.get((from_id, to_id), ()):
+            if abs(now_s - query_s) <= self.leg_tolerance_s:
+                self.legs_reused += 1
+                if departure_s >= now_s:
+                    return departure_s, travel_s, departure_s - now_s + travel_s
+                wait_s = departure_s - query_s
+                return now_s + wait_s, travel_s, wait_s + travel_s
+        return None
+
+    def reuse(self, system_bodies, entry_s):
+        previous = self.systems.get(system_bodies[0])
+        if (previous is None or sorted(previous['bodies']) != sorted(system_bodies)
+                or abs(entry_s - previous['entry_s']) > self.route_tolerance_s):
+            return None
+        self.routes_reused += 1
+        return previous['route']
+
+    def seed(self, system_bodies):
+        previous = self.systems.get(system_bodies[0])
+        if previous is None:
+            return None
+        route = [b for b in previous['route'] if b in system_bodies]
+        route += [b for b in system_bodies if b not in route]
+        self.routes_seeded += 1
+        return route
+
+    def stats(self):
+        return {'legs_reused': self.legs_reused, 'routes_reused': self.routes_reused,
+                'routes_seeded': self.routes_seeded}